@@ -1,27 +1,192 @@
+import atexit
+import importlib
 import logging
 import os
+import queue
 import sys
-from logging.handlers import TimedRotatingFileHandler
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-from . import assets, events, replication, time_series
 from ._version import __version__
 
+# Submodules are imported on first attribute access, so that e.g. `python -m cognite.replicator --help` does not pay
+# for loading the Cognite SDK and every resource module up front.
+_LAZY = {
+    "assets",
+    "datapoints",
+    "datasets",
+    "events",
+    "files",
+    "raw",
+    "relationships",
+    "replication",
+    "sequence_rows",
+    "sequences",
+    "time_series",
+}
+
+# google-cloud-logging pulls in grpc and protobuf, so it is only imported when running with GCP credentials
+_GCP_CREDENTIALS = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+_gcl = None
+if _GCP_CREDENTIALS:
+    try:
+        import google.cloud.logging as _gcl
+    except ImportError:
+        pass
+
+# Settings of the last configure_logger / configure_databricks_logger call, repeated calls with these are no-ops
+_configured_logger: Optional[Tuple] = None
+_configured_databricks_logger: Optional[Tuple] = None
+# The logger, queue handler and listener installed by configure_logger and configure_databricks_logger
+_queue_listeners: Dict[str, Tuple[logging.Logger, QueueHandler, QueueListener]] = {}
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _LAZY)
+
+
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter that reuses the formatted timestamp for all records emitted within the same second."""
+
+    _cache = (None, "")
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str = None) -> str:
+        second = int(record.created)
+        cached_second, formatted = self._cache
+        if second != cached_second:
+            formatted = time.strftime(datefmt or self.default_time_format, self.converter(record.created))
+            self._cache = (second, formatted)
+        if datefmt:
+            return formatted
+        return self.default_msec_format % (formatted, record.msecs)
+
+
+class BufferedTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """TimedRotatingFileHandler that buffers writes instead of flushing the file after every record.
+
+    The buffer is flushed every `flush_interval` seconds, when a record of level WARNING or above is emitted, and on
+    rollover and close.
+    """
+
+    buffer_size = 64 * 1024
+
+    def __init__(self, *args, flush_interval: float = 1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.flush_interval = flush_interval
+        self._closed = threading.Event()
+        # started by the first record, so a handler that is replaced before it logs anything never starts a thread
+        self._flusher = None
+
+    def _open(self):
+        return open(
+            self.baseFilename, self.mode, buffering=self.buffer_size, encoding=self.encoding, errors=self.errors
+        )
+
+    def flush(self):
+        # StreamHandler.emit calls this for every record; the buffer is flushed by _flush_stream instead
+        pass
+
+    def _flush_stream(self):
+        super().flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self._flush_stream()
+
+    def emit(self, record: logging.LogRecord):
+        if self._flusher is None and not self._closed.is_set():
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+        super().emit(record)
+        if record.levelno >= logging.WARNING:
+            self._flush_stream()
+
+    def doRollover(self):
+        self._flush_stream()
+        super().doRollover()
+
+    def close(self):
+        self._closed.set()
+        self._flush_stream()
+        super().close()
+
+
+def _queue_handlers(handlers: List[logging.Handler]) -> Tuple[QueueHandler, QueueListener]:
+    """Returns a handler that hands records over to a background thread which writes them to the given handlers.
+
+    This keeps file and network I/O off the threads doing the replication. The listener is returned as well, so it can
+    be stopped when the handler is replaced; the listeners still running are stopped, and their queues flushed, at
+    interpreter exit.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return QueueHandler(log_queue), listener
+
+
+def _remove_queue_handler(name: str) -> None:
+    """Detaches the queue handler installed under the given name, then stops its listener and closes its handlers."""
+    installed = _queue_listeners.pop(name, None)
+    if installed is None:
+        return
+    logger, queue_handler, listener = installed
+    logger.removeHandler(queue_handler)
+    queue_handler.close()
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+@atexit.register
+def _remove_queue_handlers() -> None:
+    for name in list(_queue_listeners):
+        _remove_queue_handler(name)
+
 
 def configure_logger(log_level: str = "INFO", log_path: Path = None) -> None:
     """Configure the logging to stdout and optionally local file and GCP stackdriver."""
+    global _configured_logger
+    level_name = log_level.upper()
+    level = logging._nameToLevel.get(level_name)
+    if level is None:
+        raise ValueError(f"Unknown level: {log_level!r}")
+    key = (level_name, str(log_path))
+    if key == _configured_logger:
+        return
+    _configured_logger = key
+
+    root_logger = logging.getLogger()
+    _remove_queue_handler("configure_logger")
+    if root_logger.handlers:
+        # the root logger is configured elsewhere and basicConfig would leave it alone, so build no handlers for it
+        _configure_stackdriver_logging()
+        return
+
     log_handlers = [logging.StreamHandler(sys.stdout)]
 
-    if log_path is not None:
+    if log_path:
         log_path.mkdir(parents=True, exist_ok=True)
         log_file = log_path.joinpath("cognite-replicator.log")
-        log_handlers.append(TimedRotatingFileHandler(log_file, when="midnight", backupCount=7))
+        log_handlers.append(BufferedTimedRotatingFileHandler(log_file, when="midnight", backupCount=7, delay=True))
 
-    logging.basicConfig(
-        level=logging.INFO if log_level.upper() == "INFO" else log_level,
-        format="%(asctime)s %(name)s %(levelname)s - %(message)s",
-        handlers=log_handlers,
-    )
+    formatter = _CachedTimeFormatter("%(asctime)s %(name)s %(levelname)s - %(message)s")
+    for handler in log_handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler, listener = _queue_handlers(log_handlers)
+    _queue_listeners["configure_logger"] = (root_logger, queue_handler, listener)
+    logging.basicConfig(level=level, handlers=[queue_handler])
 
     _configure_stackdriver_logging()
 
@@ -36,25 +201,31 @@ def configure_databricks_logger(
         logger: the logger to use, default is root logger
         file_path: the path to a file for storing logs to persistent disk if provided
     """
+    global _configured_databricks_logger
     if logger is None:
         logger = logging.getLogger()
+    key = (log_level, file_path, id(logger))
+    if key == _configured_databricks_logger:
+        return logger
+    _configured_databricks_logger = key
+
     logger.setLevel(log_level)
+    _remove_queue_handler("configure_databricks_logger")
     log_handlers = [logging.StreamHandler(sys.stdout)]
     if file_path is not None:
-        file_handler = TimedRotatingFileHandler(file_path, when="midnight", backupCount=7)
+        file_handler = BufferedTimedRotatingFileHandler(file_path, when="midnight", backupCount=7, delay=True)
         file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
         log_handlers.append(file_handler)
-    logger.handlers = log_handlers
+    queue_handler, listener = _queue_handlers(log_handlers)
+    _queue_listeners["configure_databricks_logger"] = (logger, queue_handler, listener)
+    logger.handlers = [queue_handler]
     logging.getLogger("py4j").setLevel(logging.ERROR)  # To remove the unnecessary databricks logging output
     return logger
 
 
 def _configure_stackdriver_logging() -> None:
     """Send logs to GCP stackdriver. Must be configured with GOOGLE_APPLICATION_CREDENTIALS."""
-    if os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
-        try:
-            import google.cloud.logging
-        except ImportError:
-            logging.warning("GOOGLE_APPLICATION_CREDENTIALS set but google-cloud-logging not available")
-        else:
-            google.cloud.logging.Client().setup_logging(name="cognite-replicator")
+    if _gcl is not None:
+        _gcl.Client().setup_logging(name="cognite-replicator")
+    elif _GCP_CREDENTIALS:
+        logging.warning("GOOGLE_APPLICATION_CREDENTIALS set but google-cloud-logging not available")
@@ -14,37 +14,66 @@ COGNITE_CONFIG_FILE or as command line argument.
 
 Example usage: poetry run replicator
 """
-import argparse
+import functools
+import json
 import logging
 import os
 import sys
 import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields
 from enum import Enum, auto, unique
 from pathlib import Path
-from typing import Optional
-import jwt
-import msal
-import getpass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 import yaml
-from cognite.client import CogniteClient, ClientConfig
+from cognite.client import CogniteClient, ClientConfig, global_config
 from cognite.client.exceptions import CogniteAPIError
-from cognite.client.credentials import OAuthClientCredentials, Token, OAuthInteractive
-from cognite.client.data_classes import assets, datapoints, events, files, raw, time_series
-
-# import __init__
-import cognite.replicator.__init__
-import cognite.replicator.assets
-import cognite.replicator.datapoints
-import cognite.replicator.events
-import cognite.replicator.files
-import cognite.replicator.raw
-import cognite.replicator.replication
-import cognite.replicator.sequences
-import cognite.replicator.sequence_rows
-import cognite.replicator.time_series
-import cognite.replicator.relationships
+
+# resource submodules are loaded lazily by the package on first use
+import cognite.replicator
+
+if TYPE_CHECKING:
+    import argparse
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
+
+
+class _UniqueKeyYamlLoader(_YamlLoader):
+    """YAML loader that rejects mappings with a repeated key instead of keeping the last value."""
+
+    def construct_mapping(self, node, deep=False):
+        if isinstance(node, yaml.MappingNode):
+            keys = set()
+            for key_node, _ in node.value:
+                if key_node.tag == "tag:yaml.org,2002:merge":
+                    continue
+                key = self.construct_object(key_node, deep=deep)
+                try:
+                    hash(key)
+                except TypeError as exc:
+                    raise yaml.constructor.ConstructorError(
+                        "while constructing a mapping",
+                        node.start_mark,
+                        f"found unhashable key ({exc})",
+                        key_node.start_mark,
+                    ) from exc
+                if key in keys:
+                    raise yaml.constructor.ConstructorError(
+                        "while constructing a mapping",
+                        node.start_mark,
+                        f"found duplicate key {key!r}",
+                        key_node.start_mark,
+                    )
+                keys.add(key)
+        return super().construct_mapping(node, deep=deep)
+
 
 ENV_VAR_FOR_CONFIG_FILE_PATH = "COGNITE_CONFIG_FILE"
+# config files are read with a single large buffer, so even big ones take a few reads
+CONFIG_FILE_BUFFER_SIZE = 1 << 20
 
 src_dst_dataset_mapping = {}
 
@@ -64,13 +93,97 @@ class Resource(Enum):
     FILES = auto()
 
 
-def create_cli_parser() -> argparse.ArgumentParser:
+@dataclass
+class ReplicatorConfig:
+    """Settings from the configuration file, with defaults for the keys that are left out."""
+
+    resources: List[str] = field(default_factory=list)
+    log_level: str = "INFO"
+    log_path: str = "log"
+    delete_if_removed_in_source: bool = False
+    delete_if_not_replicated: bool = False
+    batch_size: Optional[int] = None
+    number_of_threads: Optional[int] = None
+    replicate_concurrently: bool = False
+    client_name: Optional[str] = None
+    client_timeout: Optional[int] = None
+
+    src_authenticate_api_key: bool = False
+    src_api_key_env_var: str = "COGNITE_SOURCE_API_KEY"
+    src_baseurl: str = "https://api.cognitedata.com"
+    src_boolean_client_secret: bool = False
+    src_client_secret: str = "COGNITE_SOURCE_CLIENT_SECRET"
+    src_TENANT_ID: Optional[str] = None
+    src_CLIENT_ID: Optional[str] = None
+    src_CDF_CLUSTER: Optional[str] = None
+    src_COGNITE_PROJECT: Optional[str] = None
+    src_AUTHORITY_HOST_URI: Optional[str] = None
+
+    dst_authenticate_api_key: bool = False
+    dst_api_key_env_var: str = "COGNITE_DESTINATION_API_KEY"
+    dst_baseurl: str = "https://api.cognitedata.com"
+    dst_boolean_client_secret: bool = False
+    dst_client_secret: str = "COGNITE_DESTINATION_CLIENT_SECRET"
+    dst_TENANT_ID: Optional[str] = None
+    dst_CLIENT_ID: Optional[str] = None
+    dst_CDF_CLUSTER: Optional[str] = None
+    dst_COGNITE_PROJECT: Optional[str] = None
+    dst_AUTHORITY_HOST_URI: Optional[str] = None
+
+    events_external_ids: Optional[List[str]] = None
+    events_exclude_pattern: Optional[str] = None
+    timeseries_external_ids: Optional[List[str]] = None
+    timeseries_exclude_pattern: Optional[str] = None
+    timeseries_exclude_fields: Optional[List[str]] = None
+    files_external_ids: Optional[List[str]] = None
+    files_exclude_pattern: Optional[str] = None
+    sequences_external_ids: Optional[List[str]] = None
+    relationships_external_ids: Optional[List[str]] = None
+    datapoint_limit: Optional[int] = None
+    datapoints_start: Optional[Union[int, str]] = None
+    datapoints_end: Optional[Union[int, str]] = None
+    value_manipulation_lambda_fnc: Optional[str] = None
+    datapoints_progress_cache: Optional[str] = None
+
+    def __post_init__(self):
+        self.log_level = self.log_level.upper()
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "ReplicatorConfig":
+        """Resolves the config once, keys that are not used by the command line tool are ignored."""
+        return cls(**{key: value for key, value in config.items() if key in _CONFIG_FIELDS})
+
+
+_CONFIG_FIELDS = frozenset(config_field.name for config_field in fields(ReplicatorConfig))
+
+_NAME_TO_RESOURCE = {resource.name.lower(): resource for resource in Resource}
+_ALL_RESOURCES = frozenset(Resource)
+
+
+def create_cli_parser() -> "argparse.ArgumentParser":
     """Returns ArgumentParser for command line interface."""
+    import argparse
+
     parser = argparse.ArgumentParser()
-    parser.add_argument("config", nargs="?", help="path to yaml configuration file")
+    parser.add_argument("config", nargs="?", help="path to yaml or json configuration file")
     return parser
 
 
+@functools.lru_cache(maxsize=1)
+def _cli_parser() -> "argparse.ArgumentParser":
+    """Returns the command line parser, built once and reused by repeated main() calls."""
+    return create_cli_parser()
+
+
+def _get_config_arg(argv: List[str]) -> Optional[str]:
+    """Get the config path from the command line, only building the argument parser when flags are given."""
+    if len(argv) == 1:
+        return None
+    if len(argv) == 2 and not argv[1].startswith("-"):
+        return argv[1]
+    return _cli_parser().parse_args(argv[1:]).config
+
+
 def _validate_login_apikey(
     src_client: CogniteClient,
     dst_client: CogniteClient,
@@ -81,24 +194,50 @@ def _validate_login_apikey(
 ) -> bool:
     """Login with CogniteClients and validate projects if set."""
     try:
-        if src_api_authentication:
-            src_login_status = src_client.login.status()
-            if src_project and src_login_status.project != src_project:
-                logging.fatal("Source project don't match with API key configuration")
-                return False
-        if dst_api_authentication:
-            dst_login_status = dst_client.login.status()
-            if dst_project and dst_login_status.project != dst_project:
-                logging.fatal("Destination project don't match with API key configuration")
-                return False
+        # the two logins are independent round trips, possibly to different clusters, so run them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            src_login = executor.submit(src_client.login.status) if src_api_authentication else None
+            dst_login = executor.submit(dst_client.login.status) if dst_api_authentication else None
+            if src_login is not None:
+                src_login_status = src_login.result()
+                if src_project and src_login_status.project != src_project:
+                    logging.fatal("Source project don't match with API key configuration")
+                    return False
+            if dst_login is not None:
+                dst_login_status = dst_login.result()
+                if dst_project and dst_login_status.project != dst_project:
+                    logging.fatal("Destination project don't match with API key configuration")
+                    return False
 
     except CogniteAPIError as exc:
-        logging.fatal("Failed to login with CogniteClient {!s}".format(exc))
+        logging.fatal("Failed to login with CogniteClient %s", exc)
         return False
 
     return True
 
 
+# the capability (ACL) needed for each resource in the config
+_RESOURCE_TO_ACL = {
+    "assets": "assetsAcl",
+    "events": "eventsAcl",
+    "timeseries": "timeSeriesAcl",
+    "sequences": "sequencesAcl",
+    "relationships": "relationshipsAcl",
+    "files": "filesAcl",
+    "raw": "rawAcl",
+    "datasets": "datasetsAcl",
+}
+
+
+def _capability_actions(capabilities: List[Dict[str, Any]]) -> Dict[str, set]:
+    """Map every capability name of a token to the set of actions it grants."""
+    actions: Dict[str, set] = {}
+    for capability in capabilities:
+        for acl, scoped_actions in capability.items():
+            actions.setdefault(acl, set()).update(scoped_actions.get("actions", ()))
+    return actions
+
+
 def _validate_capabilities_oidc(
     src_client: CogniteClient,
     dst_client: CogniteClient,
@@ -108,67 +247,32 @@ def _validate_capabilities_oidc(
 ) -> bool:
     """Login with CogniteClients and validate projects if set."""
 
-    # print(needed_capabilities)                                                                                       # check which resources are going to be replicated - need read access for source and write access for destination
-
     # which capabilities to check for in the capabilities list
-    check_for_capabilities = []
-
-    # creating the list of which capabilities to search for in the cognite client object
-    if "assets" in needed_capabilities:
-        check_for_capabilities.append("assetsAcl")
-    if "events" in needed_capabilities:
-        check_for_capabilities.append("eventsAcl")
-    if "timeseries" in needed_capabilities:
-        check_for_capabilities.append("timeSeriesAcl")
-    if "sequences" in needed_capabilities:
-        check_for_capabilities.append("sequencesAcl")
-    if "relationships" in needed_capabilities:
-        check_for_capabilities.append("relationshipsAcl")
-    if "files" in needed_capabilities:
-        check_for_capabilities.append("filesAcl")
-    if "raw" in needed_capabilities:
-        check_for_capabilities.append("rawAcl")
-    if "datasets" in needed_capabilities:
-        check_for_capabilities.append("datasetsAcl")
-
-    # if 'labels' in needed_capabilities:
-    #    check_for_capabilities.append('labelsAcl')
-    # if 'types' in needed_capabilities:
-    #    check_for_capabilities.append('typesAcl')
+    check_for_capabilities = [
+        _RESOURCE_TO_ACL[resource] for resource in needed_capabilities if resource in _RESOURCE_TO_ACL
+    ]
 
     try:
         if src_api_authentication:
             # check that src_capabilities are read for all the mentioned resources
-            src_capabilities = src_client.iam.token.inspect().capabilities
-            for check_capability in check_for_capabilities:
-                for capability in src_capabilities:
-                    if check_capability in capability.keys():
-                        if not "READ" in capability[check_capability]["actions"]:
-                            return False
+            src_actions = _capability_actions(src_client.iam.token.inspect().capabilities)
+            if any("READ" not in src_actions[acl] for acl in check_for_capabilities if acl in src_actions):
+                return False
         if dst_api_authentication:
-            dst_capabilities = dst_client.iam.token.inspect().capabilities
-            for check_capability in check_for_capabilities:
-                for capability in dst_capabilities:
-                    if check_capability in capability.keys():
-                        if not "WRITE" in capability[check_capability]["actions"]:
-                            return False
+            dst_actions = _capability_actions(dst_client.iam.token.inspect().capabilities)
+            if any("WRITE" not in dst_actions[acl] for acl in check_for_capabilities if acl in dst_actions):
+                return False
 
     except CogniteAPIError as exc:
-        logging.fatal(
-            "Mismatch in needed capabilities with project capabilities with the following message: ".format(exc)
-        )
+        logging.fatal("Mismatch in needed capabilities with project capabilities with the following message: %s", exc)
         return False
     return True
 
 
 def _get_config_path(config_arg: Optional[str]) -> Path:
     """Get the config file, first either from given path or from env variable."""
-    if config_arg:
-        config_file = Path(config_arg)
-    elif os.environ.get(ENV_VAR_FOR_CONFIG_FILE_PATH):
-        config_file = Path(os.environ[ENV_VAR_FOR_CONFIG_FILE_PATH])
-    else:
-        config_file = None
+    config_arg = config_arg or os.environ.get(ENV_VAR_FOR_CONFIG_FILE_PATH)
+    config_file = Path(config_arg) if config_arg else None
 
     if not config_file or not config_file.is_file():
         logging.fatal(f"Config file not found: {config_file}")
@@ -176,340 +280,383 @@ def _get_config_path(config_arg: Optional[str]) -> Path:
     return config_file
 
 
-def get_lines_in_file(config_file):
-    """
-    Convert and return file to array lines. It excludes comment lines.
-    Args:
-        config_file: Config file
-    Returns:
-        Array of lines
-    """
-    lines = []
+# src_SCOPES = [f"https://{src_CDF_CLUSTER}.cognitedata.com/.default"]
+# src_AUTHORITY_URI: src_AUTHORITY_HOST_URI + "/" + src_TENANT_ID
+# dst_SCOPES: [f"https://{dst_CDF_CLUSTER}.cognitedata.com/.default"]
+# dst_AUTHORITY_URI: dst_AUTHORITY_HOST_URI + "/" + dst_TENANT_ID
 
-    line = config_file.readline()
-    lines.append([1, line])
 
-    line_counter = 1
-    while line:
-        line = config_file.readline()
-        if not (line.lstrip().startswith("#")):
-            lines.append([line_counter, line])
+def _replicate_assets(cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient):
+    print("Replicating assets...")
+    cognite.replicator.assets.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        config=config,
+        src_dst_dataset_mapping=src_dst_dataset_mapping,
+        delete_replicated_if_not_in_src=cfg.delete_if_removed_in_source,
+        delete_not_replicated_in_dst=cfg.delete_if_not_replicated,
+    )
 
-        line_counter += 1
 
-    return lines
+def _replicate_events(cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient):
+    print("Replicating events...")
+    cognite.replicator.events.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        batch_size=cfg.batch_size,
+        num_threads=cfg.number_of_threads,
+        config=config,
+        src_dst_dataset_mapping=src_dst_dataset_mapping,
+        delete_replicated_if_not_in_src=cfg.delete_if_removed_in_source,
+        delete_not_replicated_in_dst=cfg.delete_if_not_replicated,
+        target_external_ids=cfg.events_external_ids,
+        exclude_pattern=cfg.events_exclude_pattern,
+    )
 
 
-def get_repeat_line_numbers(lines):
-    """
-    Return repeated lines
-    Args:
-        lines: Array lines
-    Returns:
-        Array if line number
-    """
-    repeat_line_numbers = []
+def _replicate_time_series(
+    cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient
+):
+    print("Replicating time series...")
+    cognite.replicator.time_series.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        batch_size=cfg.batch_size,
+        num_threads=cfg.number_of_threads,
+        config=config,
+        src_dst_dataset_mapping=src_dst_dataset_mapping,
+        delete_replicated_if_not_in_src=cfg.delete_if_removed_in_source,
+        delete_not_replicated_in_dst=cfg.delete_if_not_replicated,
+        target_external_ids=cfg.timeseries_external_ids,
+        exclude_pattern=cfg.timeseries_exclude_pattern,
+        exclude_fields=cfg.timeseries_exclude_fields,
+    )
 
-    for line in lines:
-        lines_number_found = [x[0] for x in lines if x[1] == line[1]]
-        if len(lines_number_found) > 1:
-            repeat_line_numbers.append(line[0])
 
-    return repeat_line_numbers
+def _replicate_files(cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient):
+    print("Replicating files...")
+    cognite.replicator.files.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        batch_size=cfg.batch_size,
+        num_threads=cfg.number_of_threads,
+        config=config,
+        src_dst_dataset_mapping=src_dst_dataset_mapping,
+        delete_replicated_if_not_in_src=cfg.delete_if_removed_in_source,
+        delete_not_replicated_in_dst=cfg.delete_if_not_replicated,
+        target_external_ids=cfg.files_external_ids,
+        exclude_pattern=cfg.files_exclude_pattern,
+    )
 
 
-def get_no_repeat_lines_as_string(lines):
-    """
-    Read array lines and return lines without duplicates in single string
-    Args:
-        lines: Array lines
-    Returns:
-        single string
-    """
-    unique_lines = []
+def _replicate_raw(cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient):
+    print("Replicating raw...")
+    cognite.replicator.raw.replicate(client_src=src_client, client_dst=dst_client, chunk_size=cfg.batch_size)
+
+
+def _replicate_datapoints(cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient):
+    print("Replicating datapoints...")
+    cognite.replicator.datapoints.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        limit=cfg.datapoint_limit,
+        external_ids=cfg.timeseries_external_ids,
+        start=cfg.datapoints_start,
+        end=cfg.datapoints_end,
+        exclude_pattern=cfg.timeseries_exclude_pattern,
+        value_manipulation_lambda_fnc=cfg.value_manipulation_lambda_fnc,
+        num_threads=cfg.number_of_threads,
+        progress_cache_path=cfg.datapoints_progress_cache,
+    )
 
-    for line in lines:
-        if len(line[1]) > 0 and not (line[1] in unique_lines):
-            unique_lines.append(line[1])
 
-    return "".join(unique_lines)
+def _replicate_sequences(cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient):
+    print("Replicating sequences...")
+    cognite.replicator.sequences.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        batch_size=cfg.batch_size,
+        num_threads=cfg.number_of_threads,
+        config=config,
+        src_dst_dataset_mapping=src_dst_dataset_mapping,
+        delete_replicated_if_not_in_src=cfg.delete_if_removed_in_source,
+        delete_not_replicated_in_dst=cfg.delete_if_not_replicated,
+        target_external_ids=cfg.sequences_external_ids,
+        exclude_pattern=cfg.events_exclude_pattern,
+    )
+    print("Replicating sequences rows...")
+    cognite.replicator.sequence_rows.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        batch_size=cfg.batch_size,
+        num_threads=cfg.number_of_threads,
+    )
 
 
-# src_SCOPES = [f"https://{src_CDF_CLUSTER}.cognitedata.com/.default"]
-# src_AUTHORITY_URI: src_AUTHORITY_HOST_URI + "/" + src_TENANT_ID
-# dst_SCOPES: [f"https://{dst_CDF_CLUSTER}.cognitedata.com/.default"]
-# dst_AUTHORITY_URI: dst_AUTHORITY_HOST_URI + "/" + dst_TENANT_ID
+def _replicate_relationships(
+    cfg: ReplicatorConfig, config: Dict, src_client: CogniteClient, dst_client: CogniteClient
+):
+    print("Replicating relationships...")
+    cognite.replicator.relationships.replicate(
+        client_src=src_client,
+        client_dst=dst_client,
+        batch_size=cfg.batch_size,
+        num_threads=cfg.number_of_threads,
+        config=config,
+        src_dst_dataset_mapping=src_dst_dataset_mapping,
+        delete_replicated_if_not_in_src=cfg.delete_if_removed_in_source,
+        delete_not_replicated_in_dst=cfg.delete_if_not_replicated,
+        target_external_ids=cfg.relationships_external_ids,
+    )
 
 
-def main():
-    args = create_cli_parser().parse_args()
-    with open(_get_config_path(args.config)) as config_file:
-        config_file_lines = get_lines_in_file(config_file)
-        repeat_line_numbers = get_repeat_line_numbers(config_file_lines)
-        config_file_str = get_no_repeat_lines_as_string(config_file_lines)
-        config = yaml.safe_load(config_file_str)
-
-    cognite.replicator.__init__.configure_logger(
-        config.get("log_level", "INFO").upper(), Path(config.get("log_path", "log"))
-    )
+# Replication stages, a stage only starts once all resources of the previous one are replicated. Resources within a
+# stage do not depend on each other and can run at the same time. The resource modules are imported on first use.
+_REPLICATION_STAGES = (
+    ((Resource.ASSETS, _replicate_assets), (Resource.RAW, _replicate_raw)),
+    (
+        (Resource.EVENTS, _replicate_events),
+        (Resource.TIMESERIES, _replicate_time_series),
+        (Resource.FILES, _replicate_files),
+        (Resource.SEQUENCES, _replicate_sequences),
+    ),
+    ((Resource.DATAPOINTS, _replicate_datapoints), (Resource.RELATIONSHIPS, _replicate_relationships)),
+)
+# without concurrency the resources are replicated one at a time, in the order the replicator always used
+_SEQUENTIAL_ORDER = (
+    Resource.ASSETS,
+    Resource.EVENTS,
+    Resource.TIMESERIES,
+    Resource.FILES,
+    Resource.RAW,
+    Resource.DATAPOINTS,
+    Resource.SEQUENCES,
+    Resource.RELATIONSHIPS,
+)
+
+
+def _replicate_stages(
+    cfg: ReplicatorConfig,
+    config: Dict,
+    resources_to_replicate: frozenset,
+    src_client: CogniteClient,
+    dst_client: CogniteClient,
+):
+    """Replicate the selected resources stage by stage and concurrently within a stage if enabled in the config,
+    otherwise one at a time in _SEQUENTIAL_ORDER."""
+    if not cfg.replicate_concurrently:
+        replicators = dict(resource_replicate for stage in _REPLICATION_STAGES for resource_replicate in stage)
+        for resource in _SEQUENTIAL_ORDER:
+            if resource in resources_to_replicate:
+                replicators[resource](cfg, config, src_client, dst_client)
+        return
+
+    with ThreadPoolExecutor(max_workers=max(len(stage) for stage in _REPLICATION_STAGES)) as executor:
+        for stage in _REPLICATION_STAGES:
+            futures = [
+                executor.submit(replicate, cfg, config, src_client, dst_client)
+                for resource, replicate in stage
+                if resource in resources_to_replicate
+            ]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                # raises the exception of a failed resource, later stages would depend on it
+                future.result()
+
+
+def _configure_connection_pool(cfg: ReplicatorConfig) -> None:
+    """Sizes the connection pool the SDK shares between all clients after the threads the replication runs in.
+
+    Must be called before the first request, the SDK creates its requests session once.
+    """
+    if not cfg.number_of_threads:
+        return
+    concurrent_resources = max(len(stage) for stage in _REPLICATION_STAGES) if cfg.replicate_concurrently else 1
+    # every job thread can have a few requests in flight at once, e.g. a retrieve and the insert of the last window
+    pool_size = 4 * cfg.number_of_threads * concurrent_resources
+    global_config.max_connection_pool_size = max(global_config.max_connection_pool_size, pool_size)
 
-    if len(repeat_line_numbers) > 0:
-        for line_number in repeat_line_numbers:
-            line_found = [x for x in config_file_lines if x[0] == line_number][0]
-            logging.info(f"Config file - Repeat line {str(line_found[0])}: { line_found[1]}")
-
-    delete_replicated_if_not_in_src = config.get("delete_if_removed_in_source", False)
-    delete_not_replicated_in_dst = config.get("delete_if_not_replicated", False)
-
-    if config.get("src_authenticate_api_key"):
-        # create source Cognite client with API Key authentication
-        src_api_key = os.environ.get(config.get("src_api_key_env_var", "COGNITE_SOURCE_API_KEY"))
-        src_client = CogniteClient(
-            ClientConfig(
-                project=config.get("src_COGNITE_PROJECT"),
-                client_name=config.get("client_name"),
-                base_url=config.get("src_baseurl", "https://api.cognitedata.com"),
-                timeout=config.get("client_timeout"),
-            )
-        )
-    else:
-        # create source Cognite client with OIDC authentication
-        src_cluster = config.get("src_CDF_CLUSTER")
-        src_tenant_id = config.get("src_TENANT_ID")
-        if not config.get("src_boolean_client_secret"):
-            # authenticate by implicit login
-            src_uri = config.get("src_AUTHORITY_HOST_URI") + "/" + src_tenant_id
-            oauth_provider = OAuthInteractive(
-                authority_url=src_uri,
-                client_id=config.get("src_CLIENT_ID"),
-                scopes=[f"https://{src_cluster}.cognitedata.com/.default"],
-            )
 
+def main():
+    config_path = _get_config_path(_get_config_arg(sys.argv))
+    with open(config_path, "rb", buffering=CONFIG_FILE_BUFFER_SIZE) as config_file:
+        if config_path.suffix == ".json":
+            config = json.load(config_file)
+        else:
+            try:
+                config = yaml.load(config_file, Loader=_UniqueKeyYamlLoader)
+            except yaml.constructor.ConstructorError as exc:
+                logging.fatal(f"Invalid config file {config_path}: {exc}")
+                sys.exit(1)
+    cfg = ReplicatorConfig.from_dict(config)
+
+    cognite.replicator.configure_logger(cfg.log_level, Path(cfg.log_path) if cfg.log_path else None)
+    # None of these record attributes are part of the CLI's log format, so skip collecting them for every record.
+    # They are process-wide, so only the CLI turns them off, never a library user calling configure_logger.
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    _configure_connection_pool(cfg)
+
+    client_name = cfg.client_name
+    client_timeout = cfg.client_timeout
+
+    # clients are created on first use, so resources and validations that do not need one never pay for it
+    @functools.lru_cache(maxsize=1)
+    def get_src_client() -> CogniteClient:
+        if cfg.src_authenticate_api_key:
+            # create source Cognite client with API Key authentication
+            src_api_key = os.environ.get(cfg.src_api_key_env_var)
             src_client = CogniteClient(
                 ClientConfig(
-                    credentials=oauth_provider,
-                    project=config.get("src_COGNITE_PROJECT"),
-                    base_url=f"https://{src_cluster}.cognitedata.com",
-                    client_name="cognite-replicator",
+                    project=cfg.src_COGNITE_PROJECT,
+                    client_name=client_name,
+                    base_url=cfg.src_baseurl,
+                    timeout=client_timeout,
                 )
             )
-
         else:
-            # authenticate by client secret
-            creds = OAuthClientCredentials(
-                token_url=f"https://login.microsoftonline.com/{src_tenant_id}/oauth2/v2.0/token",
-                client_id=config.get("src_CLIENT_ID"),
-                scopes=[f"https://{src_cluster}.cognitedata.com/.default"],
-                client_secret=os.environ.get(config.get("src_client_secret", "COGNITE_SOURCE_CLIENT_SECRET")),
-            )
-            src_client = CogniteClient(
-                ClientConfig(
-                    credentials=creds,
-                    project=config.get("src_COGNITE_PROJECT"),
-                    base_url=f"https://{src_cluster}.cognitedata.com",
-                    client_name="cognite-replicator",
+            # create source Cognite client with OIDC authentication
+            # the OAuth providers pull in msal, only import them when a project authenticates with OIDC
+            from cognite.client.credentials import OAuthClientCredentials, OAuthInteractive
+
+            src_cluster = cfg.src_CDF_CLUSTER
+            src_tenant_id = cfg.src_TENANT_ID
+            if not cfg.src_boolean_client_secret:
+                # authenticate by implicit login
+                src_uri = cfg.src_AUTHORITY_HOST_URI + "/" + src_tenant_id
+                oauth_provider = OAuthInteractive(
+                    authority_url=src_uri,
+                    client_id=cfg.src_CLIENT_ID,
+                    scopes=[f"https://{src_cluster}.cognitedata.com/.default"],
                 )
-            )
-        # print(src_client.iam.token.inspect())
-
-    if config.get("dst_authenticate_api_key"):
-        # create source Cognite client with API Key authentication
-        dst_api_key = os.environ.get(config.get("dst_api_key_env_var", "COGNITE_DESTINATION_API_KEY"))
-        dst_client = CogniteClient(
-            ClientConfig(
-                project=config.get("dst_COGNITE_PROJECT"),
-                client_name=config.get("client_name"),
-                base_url=config.get("dst_baseurl", "https://api.cognitedata.com"),
-                timeout=config.get("client_timeout"),
-            )
-        )
-
-    else:
-        # create destination Cognite client with OIDC authentication
-        dst_cluster = config.get("dst_CDF_CLUSTER")
-        dst_tenant_id = config.get("dst_TENANT_ID")
-        if not config.get("dst_boolean_client_secret"):
-            # authenticate by implicit login
-            dst_uri = config.get("dst_AUTHORITY_HOST_URI") + "/" + config.get("dst_TENANT_ID")
-
-            oauth_provider = OAuthInteractive(
-                authority_url=dst_uri,
-                client_id=config.get("dst_CLIENT_ID"),
-                scopes=[f"https://{dst_cluster}.cognitedata.com/.default"],
-            )
 
+                src_client = CogniteClient(
+                    ClientConfig(
+                        credentials=oauth_provider,
+                        project=cfg.src_COGNITE_PROJECT,
+                        base_url=f"https://{src_cluster}.cognitedata.com",
+                        client_name="cognite-replicator",
+                    )
+                )
+
+            else:
+                # authenticate by client secret
+                creds = OAuthClientCredentials(
+                    token_url=f"https://login.microsoftonline.com/{src_tenant_id}/oauth2/v2.0/token",
+                    client_id=cfg.src_CLIENT_ID,
+                    scopes=[f"https://{src_cluster}.cognitedata.com/.default"],
+                    client_secret=os.environ.get(cfg.src_client_secret),
+                )
+                src_client = CogniteClient(
+                    ClientConfig(
+                        credentials=creds,
+                        project=cfg.src_COGNITE_PROJECT,
+                        base_url=f"https://{src_cluster}.cognitedata.com",
+                        client_name="cognite-replicator",
+                    )
+                )
+            # print(src_client.iam.token.inspect())
+        return src_client
+
+    @functools.lru_cache(maxsize=1)
+    def get_dst_client() -> CogniteClient:
+        if cfg.dst_authenticate_api_key:
+            # create source Cognite client with API Key authentication
+            dst_api_key = os.environ.get(cfg.dst_api_key_env_var)
             dst_client = CogniteClient(
                 ClientConfig(
-                    credentials=oauth_provider,
-                    project=config.get("dst_COGNITE_PROJECT"),
-                    base_url=f"https://{dst_cluster}.cognitedata.com",
-                    client_name="cognite-replicator",
+                    project=cfg.dst_COGNITE_PROJECT,
+                    client_name=client_name,
+                    base_url=cfg.dst_baseurl,
+                    timeout=client_timeout,
                 )
             )
 
         else:
-            # authenticate by client secret
-            creds = OAuthClientCredentials(
-                token_url=f"https://login.microsoftonline.com/{dst_tenant_id}/oauth2/v2.0/token",
-                client_id=config.get("dst_CLIENT_ID"),
-                scopes=[f"https://{dst_cluster}.cognitedata.com/.default"],
-                client_secret=os.environ.get(config.get("dst_client_secret", "COGNITE_DESTINATION_CLIENT_SECRET")),
-            )
-            dst_client = CogniteClient(
-                ClientConfig(
-                    credentials=creds,
-                    project=config.get("dst_COGNITE_PROJECT"),
-                    base_url=f"https://{dst_cluster}.cognitedata.com",
-                    client_name="cognite-replicator",
+            # create destination Cognite client with OIDC authentication
+            # the OAuth providers pull in msal, only import them when a project authenticates with OIDC
+            from cognite.client.credentials import OAuthClientCredentials, OAuthInteractive
+
+            dst_cluster = cfg.dst_CDF_CLUSTER
+            dst_tenant_id = cfg.dst_TENANT_ID
+            if not cfg.dst_boolean_client_secret:
+                # authenticate by implicit login
+                dst_uri = cfg.dst_AUTHORITY_HOST_URI + "/" + cfg.dst_TENANT_ID
+
+                oauth_provider = OAuthInteractive(
+                    authority_url=dst_uri,
+                    client_id=cfg.dst_CLIENT_ID,
+                    scopes=[f"https://{dst_cluster}.cognitedata.com/.default"],
                 )
-            )
-            # print(dst_client.iam.token.inspect())
+
+                dst_client = CogniteClient(
+                    ClientConfig(
+                        credentials=oauth_provider,
+                        project=cfg.dst_COGNITE_PROJECT,
+                        base_url=f"https://{dst_cluster}.cognitedata.com",
+                        client_name="cognite-replicator",
+                    )
+                )
+
+            else:
+                # authenticate by client secret
+                creds = OAuthClientCredentials(
+                    token_url=f"https://login.microsoftonline.com/{dst_tenant_id}/oauth2/v2.0/token",
+                    client_id=cfg.dst_CLIENT_ID,
+                    scopes=[f"https://{dst_cluster}.cognitedata.com/.default"],
+                    client_secret=os.environ.get(cfg.dst_client_secret),
+                )
+                dst_client = CogniteClient(
+                    ClientConfig(
+                        credentials=creds,
+                        project=cfg.dst_COGNITE_PROJECT,
+                        base_url=f"https://{dst_cluster}.cognitedata.com",
+                        client_name="cognite-replicator",
+                    )
+                )
+                # print(dst_client.iam.token.inspect())
+        return dst_client
 
     # check that all capabilities / login is in place
 
+    # the validations only use the clients of the projects authenticating with API keys
+    src_client = get_src_client() if cfg.src_authenticate_api_key else None
+    dst_client = get_dst_client() if cfg.dst_authenticate_api_key else None
+
     # if at least one project authenticates with API keys
-    if config.get("src_authenticate_api_key") or config.get("dst_authenticate_api_key"):
+    if cfg.src_authenticate_api_key or cfg.dst_authenticate_api_key:
         if not _validate_login_apikey(
             src_client,
             dst_client,
-            config.get("src_COGNITE_PROJECT"),
-            config.get("dst_COGNITE_PROJECT"),
-            config.get("src_authenticate_api_key"),
-            config.get("dst_authenticate_api_key"),
+            cfg.src_COGNITE_PROJECT,
+            cfg.dst_COGNITE_PROJECT,
+            cfg.src_authenticate_api_key,
+            cfg.dst_authenticate_api_key,
         ):
             sys.exit(2)
 
     # if at least one project authenticates with OIDC
-    if not (config.get("src_authenticate_api_key") or config.get("dst_authenticate_api_key")):
+    if not (cfg.src_authenticate_api_key or cfg.dst_authenticate_api_key):
         if not _validate_capabilities_oidc(
             src_client,
             dst_client,
-            config.get("resources"),
-            config.get("str_authenticate_api_key"),
-            config.get("dst_authenticate_api_key"),
+            cfg.resources,
+            cfg.src_authenticate_api_key,
+            cfg.dst_authenticate_api_key,
         ):
             sys.exit(2)
 
     # REPLICATION PROCESS
     print("Starting replication of resources")
 
-    resources_to_replicate = {Resource[resource.upper()] for resource in config.get("resources")}
+    resources_to_replicate = {_NAME_TO_RESOURCE[resource.lower()] for resource in cfg.resources}
     if Resource.ALL in resources_to_replicate:
-        resources_to_replicate.update({resource for resource in Resource})
-
-    if Resource.ASSETS in resources_to_replicate:
-        print("Replicating assets...")
-        cognite.replicator.assets.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            config=config,
-            src_dst_datasets_mapping=src_dst_dataset_mapping,
-            delete_replicated_if_not_in_src=delete_replicated_if_not_in_src,
-            delete_not_replicated_in_dst=delete_not_replicated_in_dst,
-        )
-
-    if Resource.EVENTS in resources_to_replicate:
-        print("Replicating events...")
-        cognite.replicator.events.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-            num_threads=config.get("number_of_threads"),
-            config=config,
-            src_dst_dataset_mapping=src_dst_dataset_mapping,
-            delete_replicated_if_not_in_src=delete_replicated_if_not_in_src,
-            delete_not_replicated_in_dst=delete_not_replicated_in_dst,
-            target_external_ids=config.get("events_external_ids"),
-            exclude_pattern=config.get("events_exclude_pattern"),
-        )
-
-    if Resource.TIMESERIES in resources_to_replicate:
-        print("Replicating time series...")
-        cognite.replicator.time_series.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-            num_threads=config.get("number_of_threads"),
-            config=config,
-            src_dst_dataset_mapping=src_dst_dataset_mapping,
-            delete_replicated_if_not_in_src=delete_replicated_if_not_in_src,
-            delete_not_replicated_in_dst=delete_not_replicated_in_dst,
-            target_external_ids=config.get("timeseries_external_ids"),
-            exclude_pattern=config.get("timeseries_exclude_pattern"),
-            exclude_fields=config.get("timeseries_exclude_fields"),
-        )
-
-    if Resource.FILES in resources_to_replicate:
-        print("Replicating files...")
-        cognite.replicator.files.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-            num_threads=config.get("number_of_threads"),
-            config=config,
-            src_dst_dataset_mapping=src_dst_dataset_mapping,
-            delete_replicated_if_not_in_src=delete_replicated_if_not_in_src,
-            delete_not_replicated_in_dst=delete_not_replicated_in_dst,
-            target_external_ids=config.get("files_external_ids"),
-            exclude_pattern=config.get("files_exclude_pattern"),
-        )
-
-    if Resource.RAW in resources_to_replicate:
-        print("Replicating raw...")
-        cognite.replicator.raw.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-        )
-
-    if Resource.DATAPOINTS in resources_to_replicate:
-        print("Replicating datapoints...")
-        cognite.replicator.datapoints.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            limit=config.get("datapoint_limit"),
-            external_ids=config.get("timeseries_external_ids"),
-            start=config.get("datapoints_start"),
-            end=config.get("datapoints_end"),
-            exclude_pattern=config.get("timeseries_exclude_pattern"),
-            value_manipulation_lambda_fnc=config.get("value_manipulation_lambda_fnc"),
-        )
-
-    if Resource.SEQUENCES in resources_to_replicate:
-        print("Replicating sequences...")
-        cognite.replicator.sequences.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-            num_threads=config.get("number_of_threads"),
-            config=config,
-            src_dst_dataset_mapping=src_dst_dataset_mapping,
-            delete_replicated_if_not_in_src=delete_replicated_if_not_in_src,
-            delete_not_replicated_in_dst=delete_not_replicated_in_dst,
-            target_external_ids=config.get("sequences_external_ids"),
-            exclude_pattern=config.get("events_exclude_pattern"),
-        )
-        print("Replicating sequences rows...")
-        cognite.replicator.sequence_rows.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-            num_threads=config.get("number_of_threads"),
-        )
-
-    if Resource.RELATIONSHIPS in resources_to_replicate:
-        print("Replicating relationships...")
-        cognite.replicator.relationships.replicate(
-            client_src=src_client,
-            client_dst=dst_client,
-            batch_size=config.get("batch_size"),
-            num_threads=config.get("number_of_threads"),
-            config=config,
-            src_dst_dataset_mapping=src_dst_dataset_mapping,
-            delete_replicated_if_not_in_src=delete_replicated_if_not_in_src,
-            delete_not_replicated_in_dst=delete_not_replicated_in_dst,
-            target_external_ids=config.get("relationships_external_ids"),
-        )
+        resources_to_replicate = _ALL_RESOURCES
+
+    _replicate_stages(cfg, config, resources_to_replicate, get_src_client(), get_dst_client())
 
 
 if __name__ == "__main__":
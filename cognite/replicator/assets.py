@@ -1,5 +1,6 @@
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Union, cast
 
 from cognite.client import CogniteClient
@@ -7,6 +8,9 @@ from cognite.client.data_classes.assets import Asset, AssetList
 
 from . import replication, datasets
 
+# maximum number of parent ids in one asset list filter
+PARENT_IDS_LIMIT = 100
+
 
 def build_asset_create(
     src_asset: Asset,
@@ -114,34 +118,73 @@ def find_children(assets: List[Asset], parents: Union[List[None], List[Asset]])
         A list of all the assets that are children to the parents.
 
     """
-    parent_ids = {parent.id for parent in parents} if parents != [None] else parents
+    if parents == [None]:
+        return [asset for asset in assets if asset.parent_id is None]
+    parent_ids = frozenset(parent.id for parent in parents)
     return [asset for asset in assets if asset.parent_id in parent_ids]
 
 
+def group_by_parent(assets: List[Asset]) -> Dict[Optional[int], List[Asset]]:
+    """
+    Groups the assets by their parent id, so the children of a depth can be found without scanning all the assets.
+
+    Args:
+        assets: A list of all the assets to group.
+
+    Returns:
+        A dictionary of parent id to the list of its children, root assets are under None.
+    """
+    children_by_parent: Dict[Optional[int], List[Asset]] = {}
+    for asset in assets:
+        children_by_parent.setdefault(asset.parent_id, []).append(asset)
+    return children_by_parent
+
+
+def list_replicated_assets(assets: List[Asset], function_list) -> Dict[int, Asset]:
+    """
+    Lists the destination assets that share a parent with the given assets, keyed by the source asset id they
+    were replicated from. This takes one list call for the root assets and one per PARENT_IDS_LIMIT parents,
+    however many assets there are. An asset moved to another parent in the destination is not found here, but
+    create_hierarchy already knows it from the full destination listing and updates it instead of creating it.
+
+    Args:
+        assets: A list of the assets to look up.
+        function_list: Instance of CogniteClient.assets.list
+
+    Returns:
+        A dictionary of the replicated source internal id to the destination asset.
+    """
+    parent_ids = {asset.parent_id for asset in assets if asset.metadata}
+    listed: List[Asset] = []
+    if None in parent_ids:
+        parent_ids.discard(None)
+        listed.extend(function_list(limit=None, root=True))
+    parent_ids = sorted(parent_ids)
+    for i in range(0, len(parent_ids), PARENT_IDS_LIMIT):
+        listed.extend(function_list(limit=None, parent_ids=parent_ids[i : i + PARENT_IDS_LIMIT]))
+
+    return replication.make_id_object_map(listed)
+
+
 def create_assets_replicated_id_validation(assets: List[Asset], function_create, function_list) -> List[Asset]:
     """
     Create assets and validate that was not already created.
-    It takes more time to execute.
+    The already created assets are found by listing the children of the assets' parents once.
     Args:
         assets: A list of the assets to create.
         function_create: Instance of CogniteClient.assets.create.
         function_list: Instance of CogniteClient.assets.list
     """
     ret: List[Asset] = []
-    ids_assets_already_created: List[str] = []
     assets_missing = []
 
+    replicated_assets = list_replicated_assets(assets, function_list)
     for asset in assets:
-        assets_already_created = []
-
-        if asset.metadata:
-            assets_already_created = function_list(
-                limit=1, metadata={"_replicatedInternalId": asset.metadata["_replicatedInternalId"]}
-            )
-
-        if len(assets_already_created) > 0:
-            for item in assets_already_created:
-                ret.append(item)
+        already_created = (
+            replicated_assets.get(int(asset.metadata["_replicatedInternalId"])) if asset.metadata else None
+        )
+        if already_created is not None:
+            ret.append(already_created)
         else:
             assets_missing.append(asset)
 
@@ -185,10 +228,10 @@ def create_hierarchy(
         subtree_max_depth: The maximum tree depth to replicate,
     """
     depth = 0
-    parents = [None]  # root nodes parent id is None
     if subtree_ids is not None or subtree_external_ids is not None:
         unlink_subtree_parents(src_assets, subtree_ids, subtree_external_ids)
-    children = find_children(src_assets, parents)
+    children_by_parent = group_by_parent(src_assets)
+    children = children_by_parent.get(None, [])  # root nodes parent id is None
 
     src_dst_ids: Dict[int, int] = {}
     src_id_dst_asset = replication.make_id_object_map(dst_assets)
@@ -222,6 +265,8 @@ def create_hierarchy(
         updated_assets = replication.retry(dst_client.assets.update, update_assets)
 
         src_dst_ids = replication.existing_mapping(*created_assets, *updated_assets, *unchanged_assets, ids=src_dst_ids)
+        # assets created at this depth are known destination assets from now on
+        src_id_dst_asset.update(replication.make_id_object_map(created_assets))
         logging.debug(f"Dictionary of current asset mappings: {src_dst_ids}")
 
         num_assets = len(created_assets) + len(updated_assets)
@@ -234,7 +279,7 @@ def create_hierarchy(
         if subtree_max_depth is not None and depth > subtree_max_depth:
             logging.info("Reached max depth")
             break
-        children = find_children(src_assets, children)
+        children = [child for parent in children for child in children_by_parent.get(parent.id, [])]
 
     return src_dst_ids
 
@@ -250,10 +295,10 @@ def unlink_subtree_parents(
         subtree_external_ids: The external id(s) of the subtree root(s).
     """
     logging.info("Searching for subtree parent...")
+    subtree_ids = set(subtree_ids) if subtree_ids is not None else set()
+    subtree_external_ids = set(subtree_external_ids) if subtree_external_ids is not None else set()
     for asset in src_assets:
-        if (subtree_ids is not None and asset.id in subtree_ids) or (
-            subtree_external_ids is not None and asset.external_id in subtree_external_ids
-        ):
+        if asset.id in subtree_ids or asset.external_id in subtree_external_ids:
             logging.info(f"Found the subtree root: {asset.id} with parent id: {asset.parent_id}")
             if asset.metadata is None:
                 asset.metadata = {}
@@ -296,22 +341,31 @@ def replicate(
     project_src = client_src.config.project
     project_dst = client_dst.config.project
 
-    if not subtree_ids and not subtree_external_ids:
-        assets_src = client_src.assets.list(limit=None)
-    else:
-        logging.info(f"Loading subtree(s) with id(s) {subtree_ids} or external id(s) {subtree_external_ids}")
-        assets_src = AssetList(resources=[])
-        if subtree_ids:
-            if not isinstance(subtree_ids, list):
+    # the destination assets are listed while the source assets are loaded
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assets_dst_future = executor.submit(client_dst.assets.list, limit=None)
+        if not subtree_ids and not subtree_external_ids:
+            assets_src = client_src.assets.list(limit=None)
+        else:
+            logging.info(f"Loading subtree(s) with id(s) {subtree_ids} or external id(s) {subtree_external_ids}")
+            if subtree_ids and not isinstance(subtree_ids, list):
                 subtree_ids = [subtree_ids]
-            for subtree_id in subtree_ids:
-                assets_src += client_src.assets.retrieve_subtree(id=subtree_id, depth=subtree_max_depth)
-        if subtree_external_ids:
-            if not isinstance(subtree_external_ids, list):
+            if subtree_external_ids and not isinstance(subtree_external_ids, list):
                 subtree_external_ids = [subtree_external_ids]
-            for subtree_id in subtree_external_ids:
-                assets_src += client_src.assets.retrieve_subtree(external_id=subtree_id, depth=subtree_max_depth)
-    assets_dst = client_dst.assets.list(limit=None)
+            subtree_roots = [{"id": subtree_id} for subtree_id in dict.fromkeys(subtree_ids or [])]
+            subtree_roots += [{"external_id": subtree_id} for subtree_id in dict.fromkeys(subtree_external_ids or [])]
+
+            # the subtrees are independent requests, fetch them at the same time and concatenate once
+            resources: List[Asset] = []
+            if subtree_roots:
+                with ThreadPoolExecutor(max_workers=min(8, len(subtree_roots))) as subtree_executor:
+                    for subtree in subtree_executor.map(
+                        lambda root: client_src.assets.retrieve_subtree(depth=subtree_max_depth, **root), subtree_roots
+                    ):
+                        resources.extend(subtree)
+            # overlapping subtrees return the same assets more than once
+            assets_src = AssetList(resources=list({asset.id: asset for asset in resources}.values()))
+        assets_dst = assets_dst_future.result()
 
     logging.info(f"There are {len(assets_src)} existing assets in source ({project_src}).")
     logging.info(f"There are {len(assets_dst)} existing assets in destination ({project_dst}).")
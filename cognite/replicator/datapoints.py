@@ -1,17 +1,21 @@
+import functools
 import logging
-import multiprocessing as mp
 import re
+import sqlite3
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from math import ceil, floor
-from typing import Any, Callable, List, Optional, Tuple, Union
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from cognite.client import CogniteClient
 from cognite.client.data_classes import Datapoint, Datapoints
 from cognite.client.exceptions import CogniteAPIError
 from cognite.client.utils._time import timestamp_to_ms
 
+from . import replication
+
 
 """ This is useful if there are many time series coming in at very different frequences """
 # def _get_time_range(src_datapoint: Datapoints, dst_datapoint: Datapoints) -> Tuple[int, int]:
@@ -21,33 +25,77 @@ from cognite.client.utils._time import timestamp_to_ms
 #    return start_time, end_time
 
 
-def _get_chunk(lst: List[Any], num_chunks: int, chunk_number: int) -> List[Any]:
-    """Returns a slice of the given list such that all slices are as even in size as possible.
+class DatapointProgressCache:
+    """
+    Remembers the latest datapoint timestamp replicated to each destination time series, so later runs can skip
+    asking the destination for it. Entries are kept in a sqlite file per source and destination project pair.
 
     Args:
-        lst: The list to slice
-        num_chunks: The amount of chunks that the list should be split into
-        chunk_number: Which chunk of the lst to return (0-indexed)
-
-    Returns:
-        The chunk_number-th chunk of lst such that the concat of all num_chunks chunks is equivalent to the full lst,
-        and each chunk has equal size +-1
+        path: The sqlite file to keep the progress in.
+        project_src: The name of the project the datapoints are replicated from.
+        project_dst: The name of the project the datapoints are replicated to.
+        max_age: Seconds after which a remembered timestamp is ignored and the destination is asked again.
     """
-    chunk_size = len(lst) // num_chunks
-    num_excess_elements = len(lst) % num_chunks
 
-    start_index = chunk_number * chunk_size
-    start_index += min(chunk_number, num_excess_elements)  # offset by amount of excess elements used in previous chunks
+    def __init__(self, path: str, project_src: str, project_dst: str, max_age: int = 24 * 60 * 60):
+        self.project_src = project_src
+        self.project_dst = project_dst
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS datapoint_progress ("
+                "project_src TEXT, project_dst TEXT, external_id TEXT, latest_timestamp INTEGER, observed_at REAL, "
+                "PRIMARY KEY (project_src, project_dst, external_id))"
+            )
 
-    end_index = start_index + chunk_size
-    if chunk_number < num_excess_elements:  # if we need to include an extra element
-        end_index += 1
+    def get(self, external_ids: Iterable[str]) -> Dict[str, int]:
+        """Returns the remembered latest timestamps, that are not too old, of the given time series."""
+        external_ids = list(external_ids)
+        oldest = time.time() - self.max_age
+        latest = {}
+        with self._lock:
+            for i in range(0, len(external_ids), 500):  # stay below sqlite's limit of query parameters
+                chunk = external_ids[i : i + 500]
+                rows = self._connection.execute(
+                    "SELECT external_id, latest_timestamp FROM datapoint_progress "
+                    "WHERE project_src = ? AND project_dst = ? AND observed_at >= ? "
+                    f"AND external_id IN ({','.join('?' * len(chunk))})",
+                    (self.project_src, self.project_dst, oldest, *chunk),
+                )
+                latest.update(rows)
+        return latest
+
+    def set(self, latest_timestamps: Dict[str, int]):
+        """Remembers the latest timestamps of the given time series."""
+        observed_at = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO datapoint_progress VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.project_src, self.project_dst, external_id, timestamp, observed_at)
+                    for external_id, timestamp in latest_timestamps.items()
+                ],
+            )
 
-    return lst[start_index:end_index]
+    def invalidate(self, external_ids: Iterable[str]):
+        """Forgets the given time series, their destination will be asked again on the next run."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM datapoint_progress WHERE project_src = ? AND project_dst = ? AND external_id = ?",
+                [(self.project_src, self.project_dst, external_id) for external_id in external_ids],
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
 
 
+@functools.lru_cache(maxsize=128)
 def evaluate_lambda_function(lambda_fnc_str: str):
-    """Returns callable object by evaluating lambda function string.
+    """Returns callable object by evaluating lambda function string, each distinct string is evaluated once.
     Args:
         lambda_fnc_str: lambda function string for datapoint.value manipulation
 
@@ -76,93 +124,171 @@ def replicate_datapoints_several_ts(
     start: Union[int, str] = None,
     end: Union[int, str] = None,
     value_manipulation_lambda_fnc: str = None,
+    progress_cache: Optional[DatapointProgressCache] = None,
+    src_datapoints_transform: Optional[Callable[[List[int], List[Any]], Tuple[List[int], List[Any]]]] = None,
 ) -> Tuple[bool, int]:
     """
     Copies data points from the source tenant into the destination project, for the time series in the list.
     Fetches the last datapoints from a list of time series and starts replication at that timestamp for each respective time series. June 2022 update according to updates in sdk.
+    Time series whose latest source datapoint is already in the destination are skipped, unless a start is given.
+    When a progress cache is given, the time series it remembers are not looked up in the destination.
     """
 
     logging.info(f"Number of time series into replicate function: {len(ext_ids)}")
 
     # Logging the beginning of the process
     logging.info(f"Job {job_id}: Starting datapoint replication for {len(ext_ids)} time series...")
-    logging.info(f"The timeseries included in the job are: {ext_ids}")
+    logging.info("The timeseries included in the job are: %s", ext_ids)
     start_time = datetime.now()
+    # a mock run never inserts, decide it once rather than for every window
+    insert_multiple = None if mock_run else client_dst.time_series.data.insert_multiple
+    lambda_fnc = evaluate_lambda_function(value_manipulation_lambda_fnc) if value_manipulation_lambda_fnc else None
+
+    def insert_window(insert_format_datapoints: List[Dict[str, Any]], window_latest_timestamps: Dict[str, int]):
+        insert_multiple(insert_format_datapoints)
+        logging.debug("Job %s: Datapoints inserted", job_id)
+        # only reached once the insert returned, a failed insert raises before anything is remembered
+        if progress_cache:
+            progress_cache.set(window_latest_timestamps)
 
     try:
-        dst_latest_datapoints = client_dst.time_series.data.retrieve_latest(
-            external_id=ext_ids
-        )  # getting the latest datapoints from the destination, timestamps
-        src_datapoint_queries = [
-            {
-                "external_id": dst_latest_dp.external_id,
-                "start": start or dst_latest_dp[0].timestamp if len(dst_latest_dp) > 0 else "5w-ago",
-                "end": end,
-            }
-            for dst_latest_dp in dst_latest_datapoints
+        latest_timestamps = progress_cache.get(ext_ids) if progress_cache else {}
+        probe_ext_ids = [ext_id for ext_id in ext_ids if ext_id not in latest_timestamps]
+        if probe_ext_ids:
+            # getting the latest datapoints from the destination, timestamps
+            for dst_latest_dp in client_dst.time_series.data.retrieve_latest(external_id=probe_ext_ids):
+                if len(dst_latest_dp) > 0:
+                    latest_timestamps[dst_latest_dp.external_id] = dst_latest_dp.timestamp[0]
+        # the latest source datapoints tell which time series have anything new to copy
+        src_latest_timestamps = {}
+        if ext_ids:
+            src_latest_datapoints = client_src.time_series.data.retrieve_latest(
+                external_id=ext_ids, ignore_unknown_ids=True
+            )
+            for src_latest_dp in src_latest_datapoints:
+                if len(src_latest_dp) > 0:
+                    src_latest_timestamps[src_latest_dp.external_id] = src_latest_dp.timestamp[0]
+        outdated_ext_ids = [
+            ext_id
+            for ext_id in ext_ids
+            if ext_id in src_latest_timestamps
+            and (start or ext_id not in latest_timestamps or latest_timestamps[ext_id] < src_latest_timestamps[ext_id])
         ]
-        print("Queries ready: ", time.ctime())
-        src_datapoints_to_insert = client_src.time_series.data.retrieve(
-            external_id=src_datapoint_queries
-        )  # querying the source for the datapoints matching this query
-        print("Datapoints to insert ready", time.ctime())
-        insert_format_datapoints = []
-
-        # Written this way as the insert_multiple function in the sdk does not support to insert a Datapoints object directly
-        for dplist in src_datapoints_to_insert:
-            dict_to_insert = {}
-            # if there is not yet an entry for this specific time series
-            if "externalId" not in dict_to_insert.keys():
-                dict_to_insert["externalId"] = dplist.external_id
-
-                # If datapoints should be transformed
-            transformed_dps = None
-            if src_datapoint_transform:
-                transformed_values = []
-                transformed_timestamps = []
-                for src_datapoint in dplist:
-                    transformed_datapoint = src_datapoint_transform(src_datapoint)
-                    transformed_timestamps.append(transformed_datapoint.timestamp)
-                    transformed_values.append(transformed_datapoint.value)
-                transformed_dps = Datapoints(timestamp=transformed_timestamps, value=transformed_values)
-
-                # If datapoints should get applied a lambda function
-            if value_manipulation_lambda_fnc:
-                transformed_values = []
-                transformed_timestamps = []
-                lambda_fnc = evaluate_lambda_function(value_manipulation_lambda_fnc)
-                if lambda_fnc:
-                    for src_datapoint in dplist:
-                        try:
-                            transformed_timestamps.append(src_datapoint.timestamp)
-                            transformed_values.append(lambda_fnc(src_datapoint.value))
-                        except Exception as e:
-                            logging.error(
-                                f"Could not manipulate the datapoint (value={src_datapoint.value},"
-                                + f" timestamp={src_datapoint.timestamp}). Error: {e}"
-                            )
-                    transformed_dps = Datapoints(timestamp=transformed_timestamps, value=transformed_values)
-            if transformed_dps is not None:
-                list_of_datapoints = transformed_dps
-            else:
-                list_of_datapoints = [
-                    {"timestamp": dplist[i].timestamp, "value": dplist[i].value} for i in range(len(dplist))
+        logging.info(f"Job {job_id}: {len(ext_ids) - len(outdated_ext_ids)} time series are already up to date.")
+
+        # the datapoints are copied in windows of at most partition_size per time series, so a job never holds
+        # more than two windows of every time series in memory, the one being inserted and the one being retrieved
+        pending_starts = {
+            ext_id: start or latest_timestamps[ext_id] if ext_id in latest_timestamps else "5w-ago"
+            for ext_id in outdated_ext_ids
+        }
+        if end is not None:
+            # a window starting at or after the end can only come back empty, so it is not retrieved at all
+            end_ms = timestamp_to_ms(end)
+            pending_starts = {
+                ext_id: window_start
+                for ext_id, window_start in pending_starts.items()
+                if timestamp_to_ms(window_start) < end_ms
+            }
+        copied_counts = dict.fromkeys(outdated_ext_ids, 0)
+        # at most one window is being inserted while the next one is retrieved
+        with ThreadPoolExecutor(max_workers=1) as insert_executor:
+            pending_insert = None
+            while pending_starts:
+                window_limits = {
+                    ext_id: partition_size if limit is None else min(partition_size, limit - copied_counts[ext_id])
+                    for ext_id in pending_starts
+                }
+                src_datapoint_queries = [
+                    {"external_id": ext_id, "start": window_start, "end": end, "limit": window_limits[ext_id]}
+                    for ext_id, window_start in pending_starts.items()
                 ]
-            logging.info(f"Ext id:  {dplist.external_id} Number of datapoints: {len(list_of_datapoints)}")
-
-            # This assertion needs to be in place, because the API call crashes if one ts has no datapoints to insert
-            if len(list_of_datapoints) > 0:
-                dict_to_insert["datapoints"] = list_of_datapoints
-                insert_format_datapoints.append(dict_to_insert)
-
-        print("Ready to insert datapoints...", time.ctime())
-        # insert the multiple lists of datapoints into CDF
-        if not mock_run:
-            client_dst.time_series.data.insert_multiple(insert_format_datapoints)
-            print("DATAPOINTS INSERTED AT: ", time.ctime())
+                logging.debug("Job %s: Queries ready", job_id)
+                src_datapoints_to_insert = client_src.time_series.data.retrieve(
+                    external_id=src_datapoint_queries
+                )  # querying the source for the datapoints matching this query
+                logging.debug("Job %s: Datapoints to insert ready", job_id)
+                insert_format_datapoints = []
+                window_latest_timestamps = {}
+                pending_starts = {}
+
+                for dplist in src_datapoints_to_insert:
+                    dict_to_insert = {"externalId": dplist.external_id}
+
+                    # If datapoints should be transformed
+                    transformed_dps = None
+                    timestamps, values = dplist.timestamp, dplist.value
+                    if src_datapoints_transform:
+                        timestamps, values = src_datapoints_transform(timestamps, values)
+                        transformed_dps = Datapoints(timestamp=list(timestamps), value=list(values))
+                    elif src_datapoint_transform:
+                        transformed_datapoints = list(map(src_datapoint_transform, dplist))
+                        timestamps = [datapoint.timestamp for datapoint in transformed_datapoints]
+                        values = [datapoint.value for datapoint in transformed_datapoints]
+                        transformed_dps = Datapoints(timestamp=timestamps, value=values)
+
+                    # If datapoints should get applied a lambda function, it gets the transformed values if any
+                    if lambda_fnc:
+                        # walk the parallel timestamp and value lists rather than building a Datapoint per datapoint,
+                        # each value is manipulated once and only the ones that fail are dropped
+                        transformed_values = []
+                        transformed_timestamps = []
+                        append_value, append_timestamp = transformed_values.append, transformed_timestamps.append
+                        for timestamp, value in zip(timestamps, values):
+                            try:
+                                append_value(lambda_fnc(value))
+                            except Exception as e:
+                                logging.error(
+                                    f"Could not manipulate the datapoint (value={value},"
+                                    + f" timestamp={timestamp}). Error: {e}"
+                                )
+                                continue
+                            append_timestamp(timestamp)
+                        transformed_dps = Datapoints(timestamp=transformed_timestamps, value=transformed_values)
+                    # insert_multiple takes the retrieved Datapoints object as is
+                    list_of_datapoints = transformed_dps if transformed_dps is not None else dplist
+                    insert_count = len(list_of_datapoints)
+                    logging.info("Ext id:  %s Number of datapoints: %s", dplist.external_id, insert_count)
+
+                    # This assertion needs to be in place,
+                    # because the API call crashes if one ts has no datapoints to insert
+                    if insert_count > 0:
+                        dict_to_insert["datapoints"] = list_of_datapoints
+                        insert_format_datapoints.append(dict_to_insert)
+                        # the cache remembers the latest timestamp sent to the destination, not the latest one
+                        # retrieved from the source, which a transform may move and the lambda may have dropped
+                        inserted_latest = (
+                            max(list_of_datapoints.timestamp)
+                            if src_datapoint_transform or src_datapoints_transform
+                            else list_of_datapoints.timestamp[-1]
+                        )
+                        latest_timestamps[dplist.external_id] = window_latest_timestamps[dplist.external_id] = max(
+                            latest_timestamps.get(dplist.external_id, inserted_latest), inserted_latest
+                        )
+
+                    # a full window means there can be more datapoints after it
+                    retrieved_count = len(dplist)
+                    copied_counts[dplist.external_id] += retrieved_count
+                    if retrieved_count and retrieved_count == window_limits[dplist.external_id]:
+                        if limit is None or copied_counts[dplist.external_id] < limit:
+                            pending_starts[dplist.external_id] = dplist.timestamp[-1] + 1
+
+                logging.debug("Job %s: Ready to insert datapoints", job_id)
+                # insert the multiple lists of datapoints into CDF while the next window is retrieved
+                if insert_multiple and insert_format_datapoints:
+                    if pending_insert:
+                        pending_insert.result()
+                    # only the time series inserted in this window are remembered again, the others keep their age
+                    pending_insert = insert_executor.submit(
+                        insert_window, insert_format_datapoints, window_latest_timestamps
+                    )
+            if pending_insert:
+                pending_insert.result()
 
     except CogniteAPIError as exc:
         logging.error(f"Job {job_id}: Failed for external ids {ext_ids}. {exc}")
+        if progress_cache:
+            progress_cache.invalidate(ext_ids)
         return (False, len(ext_ids))
 
     return (True, len(ext_ids))
@@ -191,6 +317,9 @@ def replicate(
     end: Union[int, str] = None,
     exclude_pattern: str = None,
     value_manipulation_lambda_fnc: str = None,
+    num_threads: int = 1,
+    progress_cache_path: Optional[str] = None,
+    src_datapoints_transform: Optional[Callable[[List[int], List[Any]], Tuple[List[int], List[Any]]]] = None,
 ):
     """
     Replicates data points from the source project into the destination project for all time series that
@@ -202,7 +331,7 @@ def replicate(
         limit: The maximum number of data points to copy per time series
         external_ids: A list of time series to replicate data points for
         mock_run: If true, runs the replication without insert, printing what would happen
-        partition_size: The maximum number of datapoints to retrieve per request
+        partition_size: The maximum number of datapoints to retrieve and insert per time series at a time
         src_datapoint_transform: Function to apply to all source datapoints before inserting into destination
         timerange_transform: Function to set the time range boundaries (start, end) arbitrarily.
         start: Timestamp to start replication onwards from; if not specified starts at most recent datapoint
@@ -210,8 +339,17 @@ def replicate(
         exclude_pattern: Regex pattern; time series whose names match will not be replicated from
         value_manipulation_lambda_fnc: A basic lambda function can be provided to manipulate datapoints as a string.
                                         It will be applied to the value of each datapoint in the timeseries.
+        num_threads: The number of jobs the time series are split into, the jobs run concurrently in threads.
+        progress_cache_path: If specified, a sqlite file remembering the latest replicated timestamp of each time
+                             series, so the destination is only asked for time series it does not know.
+        src_datapoints_transform: Function to apply to the timestamp and value lists of each retrieved batch of source
+                                  datapoints, returning the transformed lists. Faster than src_datapoint_transform,
+                                  which gets one Datapoint at a time; only one of the two can be given.
     """
 
+    if src_datapoint_transform and src_datapoints_transform:
+        raise ValueError("Both src_datapoint_transform and src_datapoints_transform were given! Only give one of them")
+
     # Confusement in which method to use
     if external_ids and exclude_pattern:
         raise ValueError(
@@ -220,55 +358,77 @@ def replicate(
 
     # Replicate based on list of external ids
     elif external_ids is not None:  # Specified list of time series is given
-        ts_src = client_src.time_series.retrieve_multiple(external_ids=external_ids, ignore_unknown_ids=True)
+        # the jobs look up the latest source datapoints ignoring unknown ids, which already drops time series that
+        # are missing in the source, so only the destination is retrieved here
         ts_dst = client_dst.time_series.retrieve_multiple(external_ids=external_ids, ignore_unknown_ids=True)
-        src_ext_id_list = [ts_obj.external_id for ts_obj in ts_src]
+        src_ext_id_list = external_ids
+        logging.info(f"Number of time series requested: {len(external_ids)}")
 
     # Replicate based on regex expression
     else:
-        ts_src = client_src.time_series.list(limit=None)
-        ts_dst = client_dst.time_series.list(limit=None)
-        filtered_ts_src = []
-        skipped_ts = []
+        ts_src, ts_dst = replication.retrieve_concurrently(
+            lambda: client_src.time_series.list(limit=None), lambda: client_dst.time_series.list(limit=None)
+        )
         if exclude_pattern:  # Filtering based on regex rule given
-            compiled_re = re.compile(exclude_pattern)
-            for ts in ts_src:
-                if ts.external_id is not None:
-                    if compiled_re.search(ts.external_id):
-                        skipped_ts.append(ts.external_id)
-                    else:
-                        filtered_ts_src.append(ts.external_id)
-            src_ext_id_list = filtered_ts_src
+            search = re.compile(exclude_pattern).search
+            named_ext_ids = [ts.external_id for ts in ts_src if ts.external_id is not None]
+            src_ext_id_list = [ext_id for ext_id in named_ext_ids if not search(ext_id)]
+            # only a sample of the skipped time series is logged, so the full list of them is never built
+            skipped_sample = list(islice((ext_id for ext_id in named_ext_ids if search(ext_id)), 5))
             logging.info(
-                f"Excluding datapoints from {len(skipped_ts)} time series, due to regex rule: {exclude_pattern}. Sample: {skipped_ts[:5]}"
+                f"Excluding datapoints from {len(named_ext_ids) - len(src_ext_id_list)} time series, "
+                f"due to regex rule: {exclude_pattern}. Sample: {skipped_sample}"
             )
             # Should probably change to logging.debug after a while
         else:  # Expects to replicate all shared time series
             src_ext_id_list = [ts_obj.external_id for ts_obj in ts_src]
-    logging.info(f"Number of time series in source: {len(ts_src)}")
+        logging.info(f"Number of time series in source: {len(ts_src)}")
     logging.info(f"Number of time series in destination: {len(ts_dst)}")
 
-    dst_ext_id_list = set([ts_obj.external_id for ts_obj in ts_dst])
-    shared_external_ids = [ext_id for ext_id in src_ext_id_list if ext_id in dst_ext_id_list and ext_id]
+    dst_ext_ids = {ts_obj.external_id for ts_obj in ts_dst if ts_obj.external_id}
+    # sorted, so every run splits the same time series into the same jobs
+    shared_external_ids = sorted(dst_ext_ids.intersection(src_ext_id_list))
     logging.info(
         f"Number of common time series external ids between destination and source: {len(shared_external_ids)}"
     )
 
-    arg_list = [
-        (
-            client_src,
-            client_dst,
-            1,
-            shared_external_ids,
-            limit,
-            mock_run,
-            partition_size,
-            src_datapoint_transform,
-            timerange_transform,
-            start,
-            end,
-            value_manipulation_lambda_fnc,
-        )
-    ]
+    progress_cache = (
+        DatapointProgressCache(progress_cache_path, client_src.config.project, client_dst.config.project)
+        if progress_cache_path
+        else None
+    )
 
-    replicate_datapoints_several_ts(*arg_list[0])
+    # the jobs are almost entirely waiting on the API, so running them in threads overlaps their requests
+    num_jobs = max(1, min(num_threads or 1, len(shared_external_ids)))
+    # the settings shared by all jobs are bound once, each job only differs in its id and time series
+    replicate_job = functools.partial(
+        replicate_datapoints_several_ts,
+        client_src,
+        client_dst,
+        limit=limit,
+        mock_run=mock_run,
+        partition_size=partition_size,
+        src_datapoint_transform=src_datapoint_transform,
+        src_datapoints_transform=src_datapoints_transform,
+        timerange_transform=timerange_transform,
+        start=start,
+        end=end,
+        value_manipulation_lambda_fnc=value_manipulation_lambda_fnc,
+        progress_cache=progress_cache,
+    )
+    job_ids = range(1, num_jobs + 1)
+    chunks = replication.get_chunks(shared_external_ids, num_jobs)
+
+    try:
+        if num_jobs == 1:
+            results = [replicate_job(job_ids[0], chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=num_jobs) as executor:
+                results = list(executor.map(replicate_job, job_ids, chunks))
+    finally:
+        if progress_cache:
+            progress_cache.close()
+
+    failed_count = sum(ts_count for success, ts_count in results if not success)
+    if failed_count:
+        logging.warning(f"Datapoint replication failed for {failed_count} of {len(shared_external_ids)} time series.")
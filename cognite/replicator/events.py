@@ -11,6 +11,11 @@ from cognite.client.exceptions import CogniteNotFoundError
 from . import replication, datasets
 
 
+def _replicated_start_time(start_time: Optional[int], end_time: Optional[int]) -> Optional[int]:
+    """Returns the start time of a replicated event, which falls back to the end time unless it comes before it."""
+    return start_time if start_time and end_time and start_time < end_time else end_time
+
+
 def create_event(
     src_event: Event,
     src_dst_ids_assets: Dict[int, int],
@@ -39,14 +44,11 @@ def create_event(
     """
     logging.debug(f"Creating a new event based on source event id {src_event.id}")
 
+    end_time = src_event.end_time
     return Event(
         external_id=src_event.external_id,
-        start_time=(
-            src_event.start_time
-            if src_event.start_time and src_event.end_time and src_event.start_time < src_event.end_time
-            else src_event.end_time
-        ),
-        end_time=src_event.end_time,
+        start_time=_replicated_start_time(src_event.start_time, end_time),
+        end_time=end_time,
         type=src_event.type,
         subtype=src_event.subtype,
         description=src_event.description,
@@ -91,13 +93,10 @@ def update_event(
     """
     logging.debug(f"Updating existing event {dst_event.id} based on source event id {src_event.id}")
 
+    end_time = src_event.end_time
     dst_event.external_id = src_event.external_id
-    dst_event.start_time = (
-        src_event.start_time
-        if src_event.start_time and src_event.end_time and src_event.start_time < src_event.end_time
-        else src_event.end_time
-    )
-    dst_event.end_time = src_event.end_time
+    dst_event.start_time = _replicated_start_time(src_event.start_time, end_time)
+    dst_event.end_time = end_time
     dst_event.type = src_event.type
     dst_event.subtype = src_event.subtype
     dst_event.description = src_event.description
@@ -105,11 +104,9 @@ def update_event(
     dst_event.asset_ids = replication.get_asset_ids(src_event.asset_ids, src_dst_ids_assets)
     dst_event.source = src_event.source
     dst_event.data_set_id = (
-        (
-            datasets.replicate(src_client, dst_client, src_event.data_set_id, src_dst_dataset_mapping)
-            if config and config.get("dataset_support", False)
-            else None
-        ),
+        datasets.replicate(src_client, dst_client, src_event.data_set_id, src_dst_dataset_mapping)
+        if config and config.get("dataset_support", False)
+        else None
     )
     return dst_event
 
@@ -261,14 +258,13 @@ def replicate(
         f"that have been replicated then it will be linked."
     )
 
-    compiled_re = None
+    # the pattern is decided on once, rather than checked again for every event
+    filter_fn = None
     if exclude_pattern:
-        compiled_re = re.compile(exclude_pattern)
+        search = re.compile(exclude_pattern).search
 
-    def filter_fn(event):
-        if exclude_pattern:
-            return compiled_re.search(event.external_id) is None
-        return True
+        def filter_fn(event):
+            return search(event.external_id) is None
 
     if skip_unlinkable or skip_nonasset or exclude_pattern:
         pre_filter_length = len(events_src)
@@ -261,14 +261,13 @@ def replicate(
         f"that have been replicated then it will be linked."
     )
 
-    compiled_re = None
+    # the pattern is decided on once, rather than checked again for every file
+    filter_fn = None
     if exclude_pattern:
-        compiled_re = re.compile(exclude_pattern)
+        search = re.compile(exclude_pattern).search
 
-    def filter_fn(file):
-        if exclude_pattern:
-            return compiled_re.search(file.external_id) is None
-        return True
+        def filter_fn(file):
+            return search(file.external_id) is None
 
     if skip_unlinkable or skip_nonasset or exclude_pattern:
         pre_filter_length = len(files_src)
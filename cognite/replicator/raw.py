@@ -23,7 +23,7 @@ def get_not_created_names(
     """
 
     src_names = [obj.name for obj in src_objects]
-    dst_names = [obj.name for obj in dst_objects]
+    dst_names = {obj.name for obj in dst_objects}
 
     not_created = [obj_name for obj_name in src_names if obj_name not in dst_names]
 
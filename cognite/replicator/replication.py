@@ -1,6 +1,8 @@
 import logging
 import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import requests
@@ -30,6 +32,43 @@ def make_id_object_map(
     }
 
 
+def retrieve_concurrently(*retrieves: Callable[[], Any]) -> List[Any]:
+    """
+    Runs independent retrieve calls, such as listing the same resource in the source and the destination, at the same
+    time.
+
+    Args:
+        retrieves: Functions without arguments that each do one retrieve.
+
+    Returns:
+        The results of the functions, in the order they were given.
+    """
+    with ThreadPoolExecutor(max_workers=len(retrieves)) as executor:
+        futures = [executor.submit(retrieve) for retrieve in retrieves]
+        return [future.result() for future in futures]
+
+
+def get_chunks(lst: List[Any], num_chunks: int) -> List[List[Any]]:
+    """
+    Splits the given list into slices that are as even in size as possible.
+
+    Args:
+        lst: The list to split
+        num_chunks: The amount of chunks that the list should be split into
+
+    Returns:
+        The num_chunks chunks of lst such that their concat is equivalent to the full lst,
+        and each chunk has equal size +-1
+    """
+    chunk_size, num_excess_elements = divmod(len(lst), num_chunks)
+    elements = iter(lst)
+    # the first num_excess_elements chunks take an extra element each
+    return [
+        list(islice(elements, chunk_size + 1 if chunk_number < num_excess_elements else chunk_size))
+        for chunk_number in range(num_chunks)
+    ]
+
+
 def filter_objects(
     objects: Union[List[Event], List[FileMetadata], List[Relationship], List[Sequence], List[TimeSeries]],
     src_dst_ids_assets: Dict[int, int],
@@ -141,11 +180,12 @@ def new_metadata(
         The metadata dictionary for the replicated destination object based on the source object.
 
     """
-    metadata: Dict[str, Any] = dict(obj.metadata if obj.metadata else {})
-    metadata["_replicatedSource"] = project_src
-    metadata["_replicatedTime"] = replicated_runtime
-    metadata["_replicatedInternalId"] = obj.id
-    return metadata
+    return {
+        **(obj.metadata or {}),
+        "_replicatedSource": project_src,
+        "_replicatedTime": replicated_runtime,
+        "_replicatedInternalId": obj.id,
+    }
 
 
 def restore_fields(
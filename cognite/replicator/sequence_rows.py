@@ -1,37 +1,16 @@
+import functools
 import logging
-import multiprocessing as mp
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import islice
 from math import ceil, floor
-from typing import Any, List, Optional, Tuple
+from typing import List, Optional, Tuple
 
 from cognite.client import CogniteClient
 from cognite.client.exceptions import CogniteAPIError
 
-
-def _get_chunk(lst: List[Any], num_chunks: int, chunk_number: int) -> List[Any]:
-    """Returns a slice of the given list such that all slices are as even in size as possible.
-
-    Args:
-        lst: The list to slice
-        num_chunks: The amount of chunks that the list should be split into
-        chunk_number: Which chunk of the lst to return (0-indexed)
-
-    Returns:
-        The chunk_number-th chunk of lst such that the concat of all num_chunks chunks is equivalent to the full lst,
-        and each chunk has equal size +-1
-    """
-    chunk_size = len(lst) // num_chunks
-    num_excess_elements = len(lst) % num_chunks
-
-    start_index = chunk_number * chunk_size
-    start_index += min(chunk_number, num_excess_elements)  # offset by amount of excess elements used in previous chunks
-
-    end_index = start_index + chunk_size
-    if chunk_number < num_excess_elements:  # if we need to include an extra element
-        end_index += 1
-
-    return lst[start_index:end_index]
+from . import replication
 
 
 def replicate_sequence_rows(
@@ -64,11 +43,11 @@ def replicate_sequence_rows(
         return True, 0
 
     seq_len = len(latest_src_seq_rows)
-    logging.debug(f"Job {job_id}: Ext_id: {seq_external_id} Replicating {seq_len} sequence rows.")
+    logging.debug("Job %s: Ext_id: %s Replicating %s sequence rows.", job_id, seq_external_id, seq_len)
     if not mock_run:
         client_dst.sequences.data.insert(latest_src_seq_rows, external_id=seq_external_id, column_external_ids=None)
 
-    logging.debug(f"Job {job_id}: Ext_id: {seq_external_id} Number of sequence rows: {seq_len}")
+    logging.debug("Job %s: Ext_id: %s Number of sequence rows: %s", job_id, seq_external_id, seq_len)
     return True, seq_len
 
 
@@ -100,8 +79,12 @@ def batch_replicate(
     failed_external_ids = []
     start_time = datetime.now()
 
+    # the progress is logged at every tenth of the batch, and not formatted at all when info logging is off
+    progress_milestones = (
+        {len(ext_ids) * k // 10 for k in range(10)} if logging.getLogger().isEnabledFor(logging.INFO) else set()
+    )
     for i, ext_id in enumerate(ext_ids):
-        if i % ceil(len(ext_ids) / 10) == 0:
+        if i in progress_milestones:
             logging.info(
                 f"Job {job_id}: Progress: On sequences {i+1}/{len(ext_ids)} "
                 f"({floor(100 * i / len(ext_ids))}% complete) in {datetime.now()-start_time}"
@@ -152,25 +135,24 @@ def replicate(
             f"List of sequence external ids AND a regex exclusion rule was given! Either remove the filter {exclude_pattern} or the list of sequences {external_ids}"
         )
     elif external_ids is not None:  # Specified list of sequences is given
-        seq_src = client_src.sequences.retrieve_multiple(external_ids=external_ids)
-        seq_dst = client_dst.sequences.retrieve_multiple(external_ids=external_ids)
+        seq_src, seq_dst = replication.retrieve_concurrently(
+            lambda: client_src.sequences.retrieve_multiple(external_ids=external_ids),
+            lambda: client_dst.sequences.retrieve_multiple(external_ids=external_ids),
+        )
         src_ext_id_list = [seq_obj.external_id for seq_obj in seq_src]
     else:
-        seq_src = client_src.sequences.list(limit=None)
-        seq_dst = client_dst.sequences.list(limit=None)
-        filtered_seq_src = []
-        skipped_seq = []
+        seq_src, seq_dst = replication.retrieve_concurrently(
+            lambda: client_src.sequences.list(limit=None), lambda: client_dst.sequences.list(limit=None)
+        )
         if exclude_pattern:  # Filtering based on regex rule given
-            compiled_re = re.compile(exclude_pattern)
-            for seq in seq_src:
-                if seq.external_id is not None:
-                    if compiled_re.search(seq.external_id):
-                        skipped_seq.append(seq.external_id)
-                    else:
-                        filtered_seq_src.append(seq.external_id)
-            src_ext_id_list = filtered_seq_src
+            search = re.compile(exclude_pattern).search
+            named_ext_ids = [seq.external_id for seq in seq_src if seq.external_id is not None]
+            src_ext_id_list = [ext_id for ext_id in named_ext_ids if not search(ext_id)]
+            # only a sample of the skipped sequences is logged, so the full list of them is never built
+            skipped_sample = list(islice((ext_id for ext_id in named_ext_ids if search(ext_id)), 5))
             logging.info(
-                f"Excluding sequence rows from {len(skipped_seq)} sequences, due to regex rule: {exclude_pattern}. Sample: {skipped_seq[:5]}"
+                f"Excluding sequence rows from {len(named_ext_ids) - len(src_ext_id_list)} sequences, "
+                f"due to regex rule: {exclude_pattern}. Sample: {skipped_sample}"
             )
             # Should probably change to logging.debug after a while
         else:  # Expects to replicate all shared sequences
@@ -178,22 +160,25 @@ def replicate(
     logging.info(f"Number of sequences in source: {len(seq_src)}")
     logging.info(f"Number of sequences in destination: {len(seq_dst)}")
 
-    dst_ext_id_list = set([seq_obj.external_id for seq_obj in seq_dst])
-    shared_external_ids = [ext_id for ext_id in src_ext_id_list if ext_id in dst_ext_id_list and ext_id]
+    dst_ext_ids = {seq_obj.external_id for seq_obj in seq_dst if seq_obj.external_id}
+    shared_external_ids = list(filter(dst_ext_ids.__contains__, src_ext_id_list))
     logging.info(f"Number of common sequences external ids between destination and source: {len(shared_external_ids)}")
 
+    if not shared_external_ids:
+        return
+
     if batch_size is None:
         batch_size = ceil(len(shared_external_ids) / num_threads)
     num_batches = ceil(len(shared_external_ids) / batch_size)
 
     logging.info(f"{num_batches} batches of size {batch_size}")
-    arg_list = [
-        (client_src, client_dst, job_id, _get_chunk(shared_external_ids, num_batches, job_id), mock_run)
-        for job_id in range(num_batches)
-    ]
+    replicate_batch = functools.partial(batch_replicate, client_src, client_dst, mock_run=mock_run)
+    job_ids = range(num_batches)
+    chunks = replication.get_chunks(shared_external_ids, num_batches)
 
+    # the batches only wait on the API, threads share the clients instead of pickling them into worker processes
     if num_threads > 1:
-        with mp.Pool(num_threads) as pool:
-            pool.starmap(batch_replicate, arg_list)
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            list(executor.map(replicate_batch, job_ids, chunks))
     else:
-        batch_replicate(*arg_list[0])
+        replicate_batch(job_ids[0], chunks[0])
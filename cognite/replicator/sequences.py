@@ -267,14 +267,13 @@ def replicate(
         f"that have been replicated then it will be linked."
     )
 
-    compiled_re = None
+    # the pattern is decided on once, rather than checked again for every sequence
+    filter_fn = None
     if exclude_pattern:
-        compiled_re = re.compile(exclude_pattern)
+        search = re.compile(exclude_pattern).search
 
-    def filter_fn(seq):
-        if exclude_pattern:
-            return compiled_re.search(seq.external_id) is None
-        return True
+        def filter_fn(seq):
+            return search(seq.external_id) is None
 
     if skip_unlinkable or skip_nonasset or exclude_pattern:
         pre_filter_length = len(seq_src)
@@ -275,14 +275,13 @@ def replicate(
         f"that have been replicated then it will be linked."
     )
 
-    compiled_re = None
+    # the pattern is decided on once, rather than checked again for every time series
+    filter_fn = _is_copyable
     if exclude_pattern:
-        compiled_re = re.compile(exclude_pattern)
+        search = re.compile(exclude_pattern).search
 
-    def filter_fn(ts):
-        if exclude_pattern:
-            return _is_copyable(ts) and compiled_re.search(ts.external_id) is None
-        return _is_copyable(ts)
+        def filter_fn(ts):
+            return _is_copyable(ts) and search(ts.external_id) is None
 
     if skip_unlinkable or skip_nonasset or exclude_pattern:
         pre_filter_length = len(ts_src)
@@ -4,11 +4,14 @@ from cognite.client import CogniteClient
 from cognite.client.data_classes.assets import Asset
 from cognite.client.testing import monkeypatch_cognite_client
 
+from cognite.replicator import assets as assets_module
 from cognite.replicator.assets import (
     build_asset_create,
     build_asset_update,
+    create_assets_replicated_id_validation,
     create_hierarchy,
     find_children,
+    group_by_parent,
     unlink_subtree_parents,
 )
 
@@ -46,6 +49,14 @@ def test_find_children():
     assert children2[0].parent_id == 7
 
 
+def test_group_by_parent():
+    assets = [Asset(id=3), Asset(id=7, parent_id=3), Asset(id=5, parent_id=3), Asset(id=9, parent_id=7)]
+    children_by_parent = group_by_parent(assets)
+    assert [asset.id for asset in children_by_parent[None]] == [3]
+    assert [asset.id for asset in children_by_parent[3]] == [7, 5]
+    assert [asset.id for asset in children_by_parent[7]] == [9]
+
+
 def test_build_asset_update():
     client = monkeypatch_cognite_client()
     assets_src = [
@@ -125,6 +136,25 @@ def test_create_hierarchy_with_dst_list():
     ]
 
 
+def test_create_assets_replicated_id_validation():
+    listed = []
+
+    def function_list(limit=None, root=None, parent_ids=None):
+        listed.append((root, parent_ids))
+        return [Asset(id=333, metadata={"_replicatedInternalId": "3"})] if root else []
+
+    def function_create(assets):
+        return [Asset(id=500 + i, metadata=asset.metadata) for i, asset in enumerate(assets)]
+
+    assets = [Asset(name="Queen", metadata={"_replicatedInternalId": 3})] + [
+        Asset(name=f"Child {i}", parent_id=333 + i % 2, metadata={"_replicatedInternalId": 10 + i}) for i in range(50)
+    ]
+    created = create_assets_replicated_id_validation(assets, function_create, function_list)
+    assert [asset.id for asset in created] == [333] + list(range(500, 550))
+    # the number of list calls depends on the parents, not on the number of assets
+    assert listed == [(True, None), (None, [333, 334])]
+
+
 def test_unlink_subtree_parents():
     assets = [
         Asset(id=1),
@@ -146,3 +176,18 @@ def test_unlink_subtree_parents():
         else:
             assert asset.parent_id == original_parent_ids[i]
             assert asset.parent_external_id == original_parent_external_ids[i]
+
+
+def test_replicate_overlapping_subtrees(monkeypatch):
+    hierarchies = []
+    monkeypatch.setattr(
+        assets_module, "create_hierarchy", lambda src_assets, *args: hierarchies.append(src_assets) or {}
+    )
+    subtrees = {1: [Asset(id=1), Asset(id=2, parent_id=1)], 2: [Asset(id=2, parent_id=1)]}
+    with monkeypatch_cognite_client() as client:
+        client.assets.retrieve_subtree.side_effect = lambda id, depth: subtrees[id]
+        client.assets.list.return_value = []
+        assets_module.replicate(client, client, subtree_ids=[1, 2, 1])
+
+    assert client.assets.retrieve_subtree.call_count == 2
+    assert [asset.id for asset in hierarchies[0]] == [1, 2]
@@ -1,22 +1,299 @@
-from cognite.client.data_classes import Datapoints
+import time
+
+import pytest
+from cognite.client.data_classes import Datapoint, Datapoints, TimeSeries
+from cognite.client.exceptions import CogniteAPIError
+from cognite.client.testing import CogniteClientMock, monkeypatch_cognite_client
 
 from cognite.replicator import datapoints
 
 
-def test_get_chunk():
-    full_list = list(range(18))
-    num_batches = 10
-    sample_arg_list = [datapoints._get_chunk(full_list, num_batches, i) for i in range(num_batches)]
-    assert sample_arg_list == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9], [10, 11], [12, 13], [14, 15], [16], [17]]
+@pytest.fixture
+def replicated_jobs(monkeypatch):
+    """Records the external ids of each job started by datapoints.replicate instead of replicating them."""
+    jobs = {}
+
+    def replicate_job(client_src, client_dst, job_id, ext_ids, **kwargs):
+        jobs[job_id] = ext_ids
+        return True, len(ext_ids)
+
+    monkeypatch.setattr(datapoints, "replicate_datapoints_several_ts", replicate_job)
+    return jobs
+
+
+def _mock_clients(src_latest, dst_latest=None):
+    """Source and destination client mocks with the given latest timestamp per external id, None for no datapoints."""
+    client_src, client_dst = CogniteClientMock(), CogniteClientMock()
+    for client, latest in [(client_src, src_latest), (client_dst, dst_latest or {})]:
+        client.time_series.data.retrieve_latest.return_value = [
+            Datapoints(external_id=ext_id, timestamp=[] if ts is None else [ts], value=[] if ts is None else [0.0])
+            for ext_id, ts in latest.items()
+        ]
+    return client_src, client_dst
+
+
+def test_replicate_splits_time_series_across_jobs(replicated_jobs):
+    with monkeypatch_cognite_client() as client:
+        client.time_series.list.return_value = [TimeSeries(id=5)] + [
+            TimeSeries(external_id=f"ts-{i}") for i in reversed(range(5))
+        ]
+        datapoints.replicate(client, client, num_threads=2)
+
+    assert replicated_jobs == {1: ["ts-0", "ts-1", "ts-2"], 2: ["ts-3", "ts-4"]}
+
+
+def test_replicate_excludes_time_series_matching_pattern(replicated_jobs):
+    with monkeypatch_cognite_client() as client:
+        client.time_series.list.return_value = [
+            TimeSeries(external_id=ext_id) for ext_id in ["ts-1", "tmp-ts-2", "ts-3"]
+        ]
+        datapoints.replicate(client, client, exclude_pattern="^tmp-")
+
+    assert replicated_jobs == {1: ["ts-1", "ts-3"]}
+
+
+def test_replicate_given_external_ids_only_retrieves_destination(replicated_jobs):
+    client_src, client_dst = CogniteClientMock(), CogniteClientMock()
+    client_dst.time_series.retrieve_multiple.return_value = [TimeSeries(external_id="ts-2")]
+    datapoints.replicate(client_src, client_dst, external_ids=["ts-1", "ts-2"])
+
+    assert replicated_jobs == {1: ["ts-2"]}
+    client_src.time_series.retrieve_multiple.assert_not_called()
+
+
+def test_datapoint_progress_cache(tmp_path):
+    cache = datapoints.DatapointProgressCache(str(tmp_path / "progress.sqlite"), "src", "dst")
+    cache.set({"ts-1": 1000, "ts-2": 2000})
+    assert cache.get(["ts-1", "ts-2", "ts-3"]) == {"ts-1": 1000, "ts-2": 2000}
+
+    cache.invalidate(["ts-1"])
+    assert cache.get(["ts-1", "ts-2"]) == {"ts-2": 2000}
+    cache.close()
+
+    other_projects = datapoints.DatapointProgressCache(str(tmp_path / "progress.sqlite"), "src", "other")
+    assert other_projects.get(["ts-2"]) == {}
+    other_projects.close()
+
+    stale = datapoints.DatapointProgressCache(str(tmp_path / "progress.sqlite"), "src", "dst", max_age=-1)
+    assert stale.get(["ts-2"]) == {}
+    stale.close()
+
+
+def test_replicate_datapoints_skips_cached_destination_lookup(tmp_path):
+    cache = datapoints.DatapointProgressCache(str(tmp_path / "progress.sqlite"), "src", "dst")
+    cache.set({"ts-1": 1000})
+    client_src, client_dst = _mock_clients({"ts-1": 2000})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[1000, 2000], value=[1.0, 2.0])
+    ]
+    success, _ = datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1"], progress_cache=cache)
+
+    assert success
+    client_dst.time_series.data.retrieve_latest.assert_not_called()
+    queries = client_src.time_series.data.retrieve.call_args.kwargs["external_id"]
+    assert queries == [{"external_id": "ts-1", "start": 1000, "end": None, "limit": 100000}]
+    assert cache.get(["ts-1"]) == {"ts-1": 2000}
+    cache.close()
+
+
+def test_replicate_datapoints_keeps_age_of_cached_time_series_not_inserted(tmp_path, monkeypatch):
+    path = str(tmp_path / "progress.sqlite")
+    cache = datapoints.DatapointProgressCache(path, "src", "dst")
+    now = time.time()
+    with monkeypatch.context() as patch:
+        patch.setattr(time, "time", lambda: now - 100)
+        cache.set({"ts-1": 1000, "ts-2": 2000})
+    client_src, client_dst = _mock_clients({"ts-1": 1000, "ts-2": 3000})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-2", timestamp=[3000], value=[3.0])
+    ]
+    datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1", "ts-2"], progress_cache=cache)
+    cache.close()
+
+    # ts-1 was up to date and not inserted, so it goes stale as if the run never happened
+    cache = datapoints.DatapointProgressCache(path, "src", "dst", max_age=50)
+    assert cache.get(["ts-1", "ts-2"]) == {"ts-2": 3000}
+    client_src.time_series.data.retrieve.return_value = []
+    datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1", "ts-2"], progress_cache=cache)
+    client_dst.time_series.data.retrieve_latest.assert_called_once_with(external_id=["ts-1"])
+    cache.close()
+
+
+@pytest.mark.parametrize(
+    "transform, expected_latest",
+    [
+        ({"src_datapoints_transform": lambda timestamps, values: ([t + 5 for t in timestamps], values)}, 2005),
+        ({"src_datapoint_transform": lambda dp: Datapoint(timestamp=dp.timestamp - 5, value=dp.value)}, 1995),
+        ({"value_manipulation_lambda_fnc": "lambda x: 1 / x"}, 1000),
+    ],
+)
+def test_replicate_datapoints_caches_latest_inserted_timestamp(tmp_path, transform, expected_latest):
+    cache = datapoints.DatapointProgressCache(str(tmp_path / "progress.sqlite"), "src", "dst")
+    client_src, client_dst = _mock_clients({"ts-1": 2000})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[1000, 2000], value=[1.0, 0.0])
+    ]
+    datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1"], progress_cache=cache, **transform)
+
+    inserted = client_dst.time_series.data.insert_multiple.call_args.args[0][0]["datapoints"]
+    assert cache.get(["ts-1"]) == {"ts-1": inserted.timestamp[-1]} == {"ts-1": expected_latest}
+    cache.close()
+
+
+def test_replicate_datapoints_in_windows():
+    client_src, client_dst = _mock_clients({"ts-1": 30}, {"ts-1": 0})
+    client_src.time_series.data.retrieve.side_effect = [
+        [Datapoints(external_id="ts-1", timestamp=[10, 20], value=[1.0, 2.0])],
+        [Datapoints(external_id="ts-1", timestamp=[30], value=[3.0])],
+    ]
+    success, _ = datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1"], partition_size=2)
+
+    assert success
+    queries = [call.kwargs["external_id"] for call in client_src.time_series.data.retrieve.call_args_list]
+    assert queries == [
+        [{"external_id": "ts-1", "start": 0, "end": None, "limit": 2}],
+        [{"external_id": "ts-1", "start": 21, "end": None, "limit": 2}],
+    ]
+    assert client_dst.time_series.data.insert_multiple.call_count == 2
+
+
+def test_replicate_datapoints_skips_up_to_date_time_series():
+    client_src, client_dst = _mock_clients({"ts-1": 30, "ts-2": 20, "ts-3": None}, {"ts-1": 30, "ts-2": 10})
+    client_src.time_series.data.retrieve.return_value = []
+    datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1", "ts-2", "ts-3"])
+
+    queries = client_src.time_series.data.retrieve.call_args.kwargs["external_id"]
+    assert [query["external_id"] for query in queries] == ["ts-2"]
+
+
+def test_evaluate_lambda_function_is_memoized():
+    lambda_fnc = datapoints.evaluate_lambda_function("lambda x: x * 2")
+
+    assert lambda_fnc(2) == 4
+    assert datapoints.evaluate_lambda_function("lambda x: x * 2") is lambda_fnc
+    assert datapoints.evaluate_lambda_function("lambda x: x *") is None
+
+
+@pytest.mark.parametrize(
+    "values, expected_timestamps, expected_values",
+    [([1.0, 2.0, 3.0], [10, 20, 30], [2.0, 4.0, 6.0]), ([1.0, "x", 3.0], [10, 30], [2.0, 6.0])],
+)
+def test_replicate_datapoints_applies_value_manipulation_lambda(values, expected_timestamps, expected_values):
+    client_src, client_dst = _mock_clients({"ts-1": 30})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[10, 20, 30], value=values)
+    ]
+    datapoints.replicate_datapoints_several_ts(
+        client_src, client_dst, 1, ["ts-1"], value_manipulation_lambda_fnc="lambda x: x * 2.0"
+    )
+
+    inserted = client_dst.time_series.data.insert_multiple.call_args.args[0][0]["datapoints"]
+    assert inserted.timestamp == expected_timestamps
+    assert inserted.value == expected_values
+
+
+def test_replicate_datapoints_manipulates_each_value_once(monkeypatch):
+    manipulated = []
+
+    def double(value):
+        manipulated.append(value)
+        return value * 2.0
+
+    monkeypatch.setattr(datapoints, "evaluate_lambda_function", lambda lambda_fnc_str: double)
+    client_src, client_dst = _mock_clients({"ts-1": 30})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[10, 20, 30], value=[1.0, None, 3.0])
+    ]
+    datapoints.replicate_datapoints_several_ts(
+        client_src, client_dst, 1, ["ts-1"], value_manipulation_lambda_fnc="lambda x: x * 2.0"
+    )
+
+    assert manipulated == [1.0, None, 3.0]
+    inserted = client_dst.time_series.data.insert_multiple.call_args.args[0][0]["datapoints"]
+    assert inserted.value == [2.0, 6.0]
+
+
+def test_replicate_datapoints_fails_when_window_insert_fails():
+    client_src, client_dst = _mock_clients({"ts-1": 20})
+    client_src.time_series.data.retrieve.side_effect = [
+        [Datapoints(external_id="ts-1", timestamp=[10], value=[1.0])],
+        [Datapoints(external_id="ts-1", timestamp=[20], value=[2.0])],
+        [],
+    ]
+    client_dst.time_series.data.insert_multiple.side_effect = CogniteAPIError("insert failed", code=500)
+    success, _ = datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1"], partition_size=1)
+
+    assert not success
+
+
+def test_replicate_datapoints_skips_time_series_past_end():
+    client_src, client_dst = _mock_clients({"ts-1": 3000}, {"ts-1": 2000})
+    success, _ = datapoints.replicate_datapoints_several_ts(client_src, client_dst, 1, ["ts-1"], end=1000)
+
+    assert success
+    client_src.time_series.data.retrieve.assert_not_called()
+
+
+def test_replicate_datapoints_applies_src_datapoint_transform():
+    client_src, client_dst = _mock_clients({"ts-1": 20})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[10, 20], value=[1.0, 2.0])
+    ]
+    datapoints.replicate_datapoints_several_ts(
+        client_src,
+        client_dst,
+        1,
+        ["ts-1"],
+        src_datapoint_transform=lambda dp: Datapoint(timestamp=dp.timestamp + 5, value=-dp.value),
+    )
+
+    inserted = client_dst.time_series.data.insert_multiple.call_args.args[0][0]["datapoints"]
+    assert inserted.timestamp == [15, 25]
+    assert inserted.value == [-1.0, -2.0]
+
+
+def test_replicate_datapoints_applies_lambda_to_transformed_datapoints():
+    client_src, client_dst = _mock_clients({"ts-1": 20})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[10, 20], value=[1.0, 2.0])
+    ]
+    datapoints.replicate_datapoints_several_ts(
+        client_src,
+        client_dst,
+        1,
+        ["ts-1"],
+        src_datapoint_transform=lambda dp: Datapoint(timestamp=dp.timestamp + 5, value=-dp.value),
+        value_manipulation_lambda_fnc="lambda x: x * 2.0",
+    )
+
+    inserted = client_dst.time_series.data.insert_multiple.call_args.args[0][0]["datapoints"]
+    assert inserted.timestamp == [15, 25]
+    assert inserted.value == [-2.0, -4.0]
+
+
+def test_replicate_datapoints_applies_src_datapoints_transform():
+    client_src, client_dst = _mock_clients({"ts-1": 20})
+    client_src.time_series.data.retrieve.return_value = [
+        Datapoints(external_id="ts-1", timestamp=[10, 20], value=[1.0, 2.0])
+    ]
+    datapoints.replicate_datapoints_several_ts(
+        client_src,
+        client_dst,
+        1,
+        ["ts-1"],
+        src_datapoints_transform=lambda timestamps, values: (timestamps[1:], [value * 10 for value in values[1:]]),
+    )
 
-    full_list = list(range(10))
-    sample_arg_list = [datapoints._get_chunk(full_list, num_batches, i) for i in range(num_batches)]
-    assert sample_arg_list == [[0], [1], [2], [3], [4], [5], [6], [7], [8], [9]]
+    inserted = client_dst.time_series.data.insert_multiple.call_args.args[0][0]["datapoints"]
+    assert inserted.timestamp == [20]
+    assert inserted.value == [20.0]
 
-    num_batches = 5
-    sample_arg_list = [datapoints._get_chunk(full_list, num_batches, i) for i in range(num_batches)]
-    assert sample_arg_list == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
 
-    full_list = [1]
-    sample_arg_list = [datapoints._get_chunk(full_list, num_batches, i) for i in range(num_batches)]
-    assert sample_arg_list == [[1], [], [], [], []]
+def test_replicate_rejects_both_datapoint_transforms():
+    with pytest.raises(ValueError):
+        datapoints.replicate(
+            CogniteClientMock(),
+            CogniteClientMock(),
+            src_datapoint_transform=lambda dp: dp,
+            src_datapoints_transform=lambda timestamps, values: (timestamps, values),
+        )
@@ -0,0 +1,45 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cognite.client.data_classes import DataSet
+from cognite.client.testing import CogniteClientMock
+
+from cognite.replicator import datasets
+
+
+def test_replicate_finds_destination_dataset_by_name():
+    src_client, dst_client = CogniteClientMock(), CogniteClientMock()
+    src_client.data_sets.retrieve.return_value = DataSet(id=1, name="plant")
+    dst_client.data_sets.list.return_value = [DataSet(id=20, name="other"), DataSet(id=21, name="plant")]
+    mapping = {}
+
+    assert datasets.replicate(src_client, dst_client, 1, mapping) == 21
+    assert mapping == {1: 21}
+    dst_client.data_sets.create.assert_not_called()
+
+    assert datasets.replicate(src_client, dst_client, 1, mapping) == 21
+    src_client.data_sets.retrieve.assert_called_once()
+
+
+def test_replicate_creates_missing_dataset_once_when_called_concurrently():
+    src_client, dst_client = CogniteClientMock(), CogniteClientMock()
+    src_client.data_sets.retrieve.return_value = DataSet(id=1, name="plant")
+    dst_client.data_sets.list.return_value = []
+    callers = threading.Barrier(4)
+
+    def create(dataset):
+        # a slow create gives the other callers time to miss the mapping
+        time.sleep(0.05)
+        return DataSet(id=30, name=dataset.name)
+
+    dst_client.data_sets.create.side_effect = create
+    mapping = {}
+
+    def resolve(_):
+        callers.wait(timeout=5)
+        return datasets.replicate(src_client, dst_client, 1, mapping)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(resolve, range(4))) == [30, 30, 30, 30]
+    dst_client.data_sets.create.assert_called_once()
@@ -1,6 +1,7 @@
-from cognite.client.data_classes import Event
-from cognite.client.testing import monkeypatch_cognite_client
+from cognite.client.data_classes import AssetList, Event, EventList
+from cognite.client.testing import CogniteClientMock, monkeypatch_cognite_client
 
+from cognite.replicator import events
 from cognite.replicator.events import copy_events, create_event, update_event
 
 
@@ -60,3 +61,26 @@ def test_copy_events():
     id_mapping = {i: i * 111 for i in range(1, 10)}
     with monkeypatch_cognite_client() as client_dst:
         copy_events(events_src, {}, id_mapping, "src-project-name", 1000000, client_dst, client_dst, {}, {}, None)
+
+
+def test_replicate_excludes_events_matching_pattern(monkeypatch):
+    copied = []
+    monkeypatch.setattr(events, "copy_events", lambda src_events, **kwargs: copied.extend(src_events))
+    client_src, client_dst = CogniteClientMock(), CogniteClientMock()
+    client_src.events.list.return_value = EventList([Event(id=1, external_id="keep"), Event(id=2, external_id="tmp-1")])
+    client_dst.events.list.return_value = EventList([])
+    client_src.assets.list.return_value = AssetList([])
+    client_dst.assets.list.return_value = AssetList([])
+
+    events.replicate(client_src, client_dst, batch_size=10, exclude_pattern="^tmp-")
+    assert [event.external_id for event in copied] == ["keep"]
+
+
+def test_update_event_without_dataset_support():
+    client = CogniteClientMock()
+    src_event = Event(metadata={}, id=1007, asset_ids=[3], start_time=5, end_time=1, data_set_id=42)
+    updated_event = update_event(src_event, Event(id=1), {3: 333}, "src-project-name", 10000000, client, client, {}, {})
+
+    assert updated_event.start_time == 1
+    assert updated_event.end_time == 1
+    assert updated_event.data_set_id is None
@@ -1,11 +1,21 @@
 from pathlib import Path
 
 import pytest
+import yaml
+from cognite.client import global_config
 from cognite.client.testing import monkeypatch_cognite_client
 
 from cognite.replicator.__main__ import (
     ENV_VAR_FOR_CONFIG_FILE_PATH,
+    Resource,
+    ReplicatorConfig,
+    _REPLICATION_STAGES,
+    _UniqueKeyYamlLoader,
+    _configure_connection_pool,
+    _get_config_arg,
     _get_config_path,
+    _replicate_stages,
+    _validate_capabilities_oidc,
     _validate_login_apikey,
     create_cli_parser,
 )
@@ -17,6 +27,17 @@ def test_validate_login():
         assert valid is True
 
 
+def test_validate_capabilities_oidc():
+    with monkeypatch_cognite_client() as client:
+        client.iam.token.inspect.return_value.capabilities = [
+            {"assetsAcl": {"actions": ["READ"], "scope": {"all": {}}}},
+            {"eventsAcl": {"actions": ["READ", "WRITE"], "scope": {"all": {}}}},
+        ]
+        assert _validate_capabilities_oidc(client, client, ["events"], True, True) is True
+        assert _validate_capabilities_oidc(client, client, ["assets"], True, False) is True
+        assert _validate_capabilities_oidc(client, client, ["assets", "events"], True, True) is False
+
+
 def test_cli_parser():
     parser = create_cli_parser()
     args = parser.parse_args(args=["config/test.yml"])
@@ -24,3 +45,97 @@ def test_cli_parser():
 
     args = parser.parse_args(args=[])
     assert args.config is None
+
+
+def test_get_config_arg():
+    assert _get_config_arg(["replicator"]) is None
+    assert _get_config_arg(["replicator", "config/test.yml"]) == "config/test.yml"
+    with pytest.raises(SystemExit):
+        _get_config_arg(["replicator", "--unknown-flag"])
+
+
+def test_replicator_config_from_dict():
+    cfg = ReplicatorConfig.from_dict(
+        {"resources": ["assets"], "batch_size": 100, "log_level": "debug", "high_frequence_variability": True}
+    )
+    assert cfg.resources == ["assets"]
+    assert cfg.batch_size == 100
+    assert cfg.log_level == "DEBUG"
+    assert cfg.src_client_secret == "COGNITE_SOURCE_CLIENT_SECRET"
+    assert not hasattr(cfg, "high_frequence_variability")
+
+
+def test_unique_key_yaml_loader():
+    assert yaml.load("resources:\n  - assets\n  - assets\n", Loader=_UniqueKeyYamlLoader) == {
+        "resources": ["assets", "assets"]
+    }
+    with pytest.raises(yaml.constructor.ConstructorError, match="duplicate key 'batch_size'"):
+        yaml.load("batch_size: 10\nresources: []\nbatch_size: 20\n", Loader=_UniqueKeyYamlLoader)
+    with pytest.raises(yaml.constructor.ConstructorError, match="found unhashable key"):
+        yaml.load("? [a, b]\n: 1\n", Loader=_UniqueKeyYamlLoader)
+
+
+@pytest.mark.parametrize("replicate_concurrently", [True, False])
+def test_replicate_stages(monkeypatch, replicate_concurrently):
+    replicated = []
+
+    def replicate_as(resource):
+        return lambda cfg, config, src_client, dst_client: replicated.append(resource)
+
+    stages = (
+        ((Resource.ASSETS, replicate_as(Resource.ASSETS)), (Resource.RAW, replicate_as(Resource.RAW))),
+        ((Resource.EVENTS, replicate_as(Resource.EVENTS)),),
+    )
+    monkeypatch.setattr("cognite.replicator.__main__._REPLICATION_STAGES", stages)
+    cfg = ReplicatorConfig(replicate_concurrently=replicate_concurrently)
+
+    _replicate_stages(cfg, {}, frozenset({Resource.ASSETS, Resource.EVENTS}), None, None)
+    assert replicated == [Resource.ASSETS, Resource.EVENTS]
+
+
+def test_replicate_stages_sequentially_in_original_order(monkeypatch):
+    replicated = []
+    stages = tuple(
+        tuple((resource, lambda *args, resource=resource: replicated.append(resource)) for resource, _ in stage)
+        for stage in _REPLICATION_STAGES
+    )
+    monkeypatch.setattr("cognite.replicator.__main__._REPLICATION_STAGES", stages)
+
+    _replicate_stages(ReplicatorConfig(), {}, frozenset(Resource) - {Resource.ALL}, None, None)
+    assert replicated == [
+        Resource.ASSETS,
+        Resource.EVENTS,
+        Resource.TIMESERIES,
+        Resource.FILES,
+        Resource.RAW,
+        Resource.DATAPOINTS,
+        Resource.SEQUENCES,
+        Resource.RELATIONSHIPS,
+    ]
+
+
+def test_replicate_stages_stops_on_failure(monkeypatch):
+    def fail(cfg, config, src_client, dst_client):
+        raise RuntimeError("assets failed")
+
+    def not_reached(cfg, config, src_client, dst_client):
+        raise AssertionError("stage after a failure was started")
+
+    stages = (((Resource.ASSETS, fail),), ((Resource.EVENTS, not_reached),))
+    monkeypatch.setattr("cognite.replicator.__main__._REPLICATION_STAGES", stages)
+
+    with pytest.raises(RuntimeError, match="assets failed"):
+        _replicate_stages(ReplicatorConfig(), {}, frozenset({Resource.ASSETS, Resource.EVENTS}), None, None)
+
+
+def test_configure_connection_pool(monkeypatch):
+    monkeypatch.setattr(global_config, "max_connection_pool_size", 50)
+
+    _configure_connection_pool(ReplicatorConfig(number_of_threads=2))
+    assert global_config.max_connection_pool_size == 50
+
+    _configure_connection_pool(ReplicatorConfig(number_of_threads=10, replicate_concurrently=False))
+    assert global_config.max_connection_pool_size == 50
+
+    _configure_connection_pool(ReplicatorConfig(number_of_threads=10, replicate_concurrently=True))
+    assert global_config.max_connection_pool_size == 160
@@ -6,12 +6,32 @@ from cognite.replicator.replication import (
     filter_objects,
     find_objects_to_delete_if_not_in_src,
     find_objects_to_delete_not_replicated_in_dst,
+    get_chunks,
     make_id_object_map,
     make_objects_batch,
     remove_replication_metadata,
 )
 
 
+def test_get_chunks():
+    full_list = list(range(18))
+    num_batches = 10
+    sample_arg_list = get_chunks(full_list, num_batches)
+    assert sample_arg_list == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9], [10, 11], [12, 13], [14, 15], [16], [17]]
+
+    full_list = list(range(10))
+    sample_arg_list = get_chunks(full_list, num_batches)
+    assert sample_arg_list == [[0], [1], [2], [3], [4], [5], [6], [7], [8], [9]]
+
+    num_batches = 5
+    sample_arg_list = get_chunks(full_list, num_batches)
+    assert sample_arg_list == [[0, 1], [2, 3], [4, 5], [6, 7], [8, 9]]
+
+    full_list = [1]
+    sample_arg_list = get_chunks(full_list, num_batches)
+    assert sample_arg_list == [[1], [], [], [], []]
+
+
 def test_make_id_object_map():
     assets = [Asset(id=3, metadata={"_replicatedInternalId": 55}), Asset(id=2)]
     mapping = make_id_object_map(assets)
@@ -1,8 +1,103 @@
+import logging
+
+import pytest
 import toml
 
-from cognite.replicator import __version__
+import cognite.replicator
+from cognite.replicator import (
+    BufferedTimedRotatingFileHandler,
+    _CachedTimeFormatter,
+    __version__,
+    configure_databricks_logger,
+    configure_logger,
+)
 
 
 def test_version_consistency():
     project_settings = toml.load("pyproject.toml")
     assert project_settings["tool"]["poetry"]["version"] == __version__
+
+
+def test_lazy_submodule_access():
+    import cognite.replicator
+
+    assert cognite.replicator.replication.__name__ == "cognite.replicator.replication"
+    with pytest.raises(AttributeError):
+        cognite.replicator.not_a_module
+
+
+def test_cached_time_formatter():
+    formatter = _CachedTimeFormatter("%(asctime)s %(message)s")
+    reference = logging.Formatter("%(asctime)s %(message)s")
+    for created in (1700000000.123, 1700000000.456, 1700000001.001):
+        record = logging.makeLogRecord({"msg": "message", "created": created, "msecs": (created % 1) * 1000})
+        assert formatter.format(record) == reference.format(record)
+
+
+def test_buffered_file_handler(tmp_path):
+    log_file = tmp_path.joinpath("replicator.log")
+    handler = BufferedTimedRotatingFileHandler(log_file, when="midnight", flush_interval=60)
+    assert handler._flusher is None
+    handler.emit(logging.makeLogRecord({"msg": "buffered", "levelno": logging.INFO}))
+    assert log_file.read_text() == ""
+
+    handler.emit(logging.makeLogRecord({"msg": "flushed", "levelno": logging.WARNING}))
+    assert log_file.read_text() == "buffered\nflushed\n"
+
+    handler.emit(logging.makeLogRecord({"msg": "closed", "levelno": logging.INFO}))
+    handler.close()
+    assert log_file.read_text().endswith("closed\n")
+
+
+def test_configure_databricks_logger_is_idempotent():
+    logger = logging.getLogger("test_configure_databricks_logger_is_idempotent")
+    configure_databricks_logger(logging.INFO, logger)
+    handlers = logger.handlers
+    assert configure_databricks_logger(logging.INFO, logger) is logger
+    assert logger.handlers is handlers
+
+
+def test_configure_databricks_logger_stops_replaced_listener():
+    logger = logging.getLogger("test_configure_databricks_logger_stops_replaced_listener")
+    configure_databricks_logger(logging.INFO, logger)
+    _, first_handler, first_listener = cognite.replicator._queue_listeners["configure_databricks_logger"]
+
+    configure_databricks_logger(logging.DEBUG, logger)
+    assert first_listener._thread is None
+    assert logger.handlers == [cognite.replicator._queue_listeners["configure_databricks_logger"][1]]
+    assert first_handler not in logger.handlers
+    cognite.replicator._remove_queue_handler("configure_databricks_logger")
+    assert logger.handlers == []
+
+
+def test_configure_logger_leaves_configured_root_logger_alone(monkeypatch):
+    root_logger = logging.getLogger()
+    existing_handler = logging.NullHandler()
+    monkeypatch.setattr(root_logger, "handlers", [existing_handler])
+    monkeypatch.setattr(cognite.replicator, "_configured_logger", None)
+
+    configure_logger("DEBUG")
+    assert root_logger.handlers == [existing_handler]
+    assert "configure_logger" not in cognite.replicator._queue_listeners
+
+
+def test_configure_logger_replaces_its_own_handler(monkeypatch):
+    root_logger = logging.getLogger()
+    monkeypatch.setattr(root_logger, "handlers", [])
+    monkeypatch.setattr(root_logger, "level", root_logger.level)
+    monkeypatch.setattr(cognite.replicator, "_configured_logger", None)
+
+    configure_logger("INFO")
+    _, first_handler, first_listener = cognite.replicator._queue_listeners["configure_logger"]
+    configure_logger("DEBUG")
+    _, second_handler, _ = cognite.replicator._queue_listeners["configure_logger"]
+
+    assert first_listener._thread is None
+    assert root_logger.handlers == [second_handler]
+    assert root_logger.level == logging.DEBUG
+    cognite.replicator._remove_queue_handler("configure_logger")
+
+
+def test_configure_logger_rejects_unknown_level():
+    with pytest.raises(ValueError, match="Unknown level"):
+        configure_logger("LOUD")
@@ -1,5 +1,6 @@
 from cognite.client.data_classes import Sequence
 from cognite.client.testing import monkeypatch_cognite_client
+from cognite.replicator import sequence_rows
 from cognite.replicator.sequences import create_sequence, update_sequence
 
 
@@ -64,3 +65,17 @@ def test_update_sequence():
                 assert key in updated_sequence.metadata.keys()
                 assert src_sequences[i].metadata[key] == updated_sequence.metadata[key]
         assert updated_sequence.asset_id == id_mapping[src_sequences[i].asset_id]
+
+
+def test_replicate_sequence_rows_in_threads(monkeypatch):
+    batches = {}
+
+    def batch_replicate(client_src, client_dst, job_id, ext_ids, mock_run=False):
+        batches[job_id] = ext_ids
+
+    monkeypatch.setattr(sequence_rows, "batch_replicate", batch_replicate)
+    with monkeypatch_cognite_client() as client:
+        client.sequences.list.return_value = [Sequence(external_id=f"seq-{i}") for i in range(5)]
+        sequence_rows.replicate(client, client, num_threads=2)
+
+    assert batches == {0: ["seq-0", "seq-1", "seq-2"], 1: ["seq-3", "seq-4"]}